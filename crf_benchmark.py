@@ -0,0 +1,219 @@
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+from reportlab.pdfgen import canvas
+
+# Column headers of a REDCap data dictionary export, in export order
+REDCAP_HEADERS = [
+    'Variable / Field Name', 'Form Name', 'Section Header', 'Field Type', 'Field Label',
+    'Choices, Calculations, OR Slider Labels', 'Field Note', 'Text Validation Type OR Show Slider Number',
+    'Text Validation Min', 'Text Validation Max', 'Identifier?', 'Branching Logic (Show field only if...)',
+    'Required Field?', 'Custom Alignment', 'Question Number (surveys only)', 'Matrix Group Name',
+    'Matrix Ranking?', 'Field Annotation'
+]
+
+# Same renaming the creator scripts apply before rendering
+RENAMED_COLUMNS = {
+    'Variable / Field Name': 'variable_name', 'Form Name': 'form', 'Section Header': 'section_header',
+    'Field Type': 'type', 'Field Label': 'question', 'Choices, Calculations, OR Slider Labels': 'choice',
+    'Field Note': 'field_note', 'Text Validation Type OR Show Slider Number': 'validation_type',
+    'Text Validation Min': 'validation_min', 'Text Validation Max': 'validation_max',
+    'Identifier?': 'identifier', 'Branching Logic (Show field only if...)': 'branching_logic',
+    'Required Field?': 'required_field', 'Custom Alignment': 'custom_alignment',
+    'Question Number (surveys only)': 'question_number', 'Matrix Group Name': 'matrix_name',
+    'Matrix Ranking?': 'matrix_ranking', 'Field Annotation': 'field_annotation'
+}
+
+WORDS = ("patient medication history daily symptoms treatment doctor diagnosis pain sleep "
+         "exercise diet alcohol tobacco family hospital visit year month week current past "
+         "ongoing severe mild condition blood pressure heart lung kidney liver skin").split()
+
+FIELD_TYPES = ["text", "notes", "radio", "checkbox"]
+FIELD_TYPE_WEIGHTS = [36, 18, 39, 7]  # Roughly the mix found in test.csv
+
+def generate_dictionary(path, forms=7, fields=50, matrix_groups=2, matrix_rows=6,
+                        label_words=(3, 25), choices=(2, 6), seed=0):
+    """
+    Writes a synthetic REDCap data dictionary with the given shape and returns its row count.
+    Each form gets `fields` plain fields plus `matrix_groups` groups of `matrix_rows` radio rows.
+    """
+    rng = random.Random(seed)
+
+    def label():
+        return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(*label_words))).capitalize() + ':'
+
+    def choice_list():
+        return ' | '.join(f"{i}, {label()[:-1]}" for i in range(1, rng.randint(*choices) + 1))
+
+    rows = []
+    for form_index in range(forms):
+        form_name = f"synthetic_form_{form_index:03d}"
+        for field_index in range(fields):
+            field_type = rng.choices(FIELD_TYPES, FIELD_TYPE_WEIGHTS)[0]
+            rows.append({
+                'Variable / Field Name': f"f{form_index}_q{field_index}",
+                'Form Name': form_name,
+                'Field Type': field_type,
+                'Field Label': label(),
+                'Choices, Calculations, OR Slider Labels': choice_list() if field_type in ("radio", "checkbox") else None,
+            })
+        for group_index in range(matrix_groups):
+            group_choices = choice_list()
+            for row_index in range(matrix_rows):
+                rows.append({
+                    'Variable / Field Name': f"f{form_index}_m{group_index}_{row_index}",
+                    'Form Name': form_name,
+                    'Field Type': "radio",
+                    'Field Label': label(),
+                    'Choices, Calculations, OR Slider Labels': group_choices,
+                    'Matrix Group Name': f"matrix_{form_index}_{group_index}",
+                })
+    pd.DataFrame(rows, columns=REDCAP_HEADERS).to_csv(path, index=False)
+    return len(rows)
+
+class SaveTimer:
+    # Wraps reportlab's Canvas.save for the whole process, so c.save() is timed on its own
+    # whether a script imports canvas directly or through the crf_generator package
+    seconds = 0.0
+
+    def __enter__(self):
+        original_save = self.original_save = canvas.Canvas.save
+
+        def timed_save(c):
+            start = time.perf_counter()
+            original_save(c)
+            SaveTimer.seconds += time.perf_counter() - start
+
+        canvas.Canvas.save = timed_save
+        return self
+
+    def __exit__(self, *exc_info):
+        canvas.Canvas.save = self.original_save
+
+@contextmanager
+def timed(stages, name):
+    start = time.perf_counter()
+    yield
+    stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+
+def load_script(script_path, stages):
+    """
+    Imports a creator script by path. Scripts older than v1.13 render test.csv at import time;
+    the caller runs this inside a directory whose test.csv is the synthetic dictionary, and that
+    run is reported as the import_run stage.
+    """
+    module_name = "crf_" + os.path.splitext(os.path.basename(script_path))[0].replace('-', '_').replace('.', '_')
+    spec = importlib.util.spec_from_file_location(module_name, script_path)
+    module = importlib.util.module_from_spec(spec)
+    with timed(stages, 'import_run'):
+        spec.loader.exec_module(module)
+    return module
+
+def benchmark_script(script_path, dictionary_path, repeat=1):
+    """
+    Times each pipeline stage of one creator script against a dictionary and returns the results.
+    Stages a script does not have (preprocessing before v1.13) are left out.
+    """
+    script_path = os.path.abspath(script_path)
+    stages = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        previous_dir = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            pd.read_csv(dictionary_path).to_csv('test.csv', index=False)
+            module = load_script(script_path, stages)
+            with SaveTimer():
+                for _ in range(repeat):
+                    run_stages(module, 'test.csv', stages)
+        finally:
+            os.chdir(previous_dir)
+
+    results = {name: seconds / (1 if name == 'import_run' else repeat) for name, seconds in stages.items()}
+    return {'script': os.path.basename(script_path), 'repeat': repeat, 'stages': results}
+
+def run_stages(module, csv_file, stages):
+    with timed(stages, 'csv_load'):
+        data = pd.read_csv(csv_file)
+        data.rename(columns=getattr(module, 'CSV_COLUMNS', RENAMED_COLUMNS), inplace=True)
+
+    if hasattr(module, 'preprocess_fields'):
+        with timed(stages, 'preprocessing'):
+            fields = module.preprocess_fields(data)
+            forms = [(form_name, module.form_field_tuples(form_fields))
+                     for form_name, form_fields in fields.groupby('form')]
+    else:
+        forms = [(form_name, form_data) for form_name, form_data in data.groupby('form')]
+
+    if hasattr(module, 'wrap_lines'):
+        # Time cold caches, as a fresh run would see them: wrapped lines and measured words
+        module.wrap_lines.cache_clear()
+        text_module = sys.modules[module.wrap_lines.__module__]
+        if hasattr(text_module, 'WORD_UNITS'):
+            text_module.WORD_UNITS.clear()
+        if hasattr(text_module, 'LAYOUT_LINES'):
+            text_module.LAYOUT_LINES.cache_clear()
+    layout_module = sys.modules[module.layout_form.__module__] if hasattr(module, 'layout_form') else None
+    if hasattr(layout_module, 'wrap_form_texts') and hasattr(module, 'preprocess_fields'):
+        # Time the wrapping layout_form does: every label of a form at once, through the run's cache
+        with timed(stages, 'wrap_text'):
+            for form_name, form_fields in forms:
+                layout_module.wrap_form_texts(*layout_module.group_fields(form_fields), 512)
+    else:
+        c = canvas.Canvas(os.devnull)
+        with timed(stages, 'wrap_text'):
+            for question in data['question'].fillna('').astype(str):
+                for max_width in (512, 140):
+                    module.wrap_text(question, c, max_width)
+
+    pdf_files = []
+    SaveTimer.seconds = 0.0
+    start = time.perf_counter()
+    for form_name, form_data in forms:
+        output_pdf = f"{form_name}.pdf"
+        module.create_pdf_for_form(form_data, form_name, output_pdf)
+        pdf_files.append(output_pdf)
+    render_seconds = time.perf_counter() - start
+    stages['canvas_drawing'] = stages.get('canvas_drawing', 0.0) + render_seconds - SaveTimer.seconds
+    stages['canvas_save'] = stages.get('canvas_save', 0.0) + SaveTimer.seconds
+
+    with timed(stages, 'merge_pdfs'):
+        module.merge_pdfs(pdf_files, "combined_forms.pdf")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the CRF generator stages on a synthetic REDCap data dictionary.")
+    parser.add_argument("scripts", nargs="+", help="Creator scripts to compare, e.g. 2024-12-05_crf-creator_v1.13.py")
+    parser.add_argument("--forms", type=int, default=7)
+    parser.add_argument("--fields", type=int, default=50, help="Plain fields per form")
+    parser.add_argument("--matrix-groups", type=int, default=2, help="Matrix groups per form")
+    parser.add_argument("--matrix-rows", type=int, default=6, help="Rows per matrix group")
+    parser.add_argument("--label-words", type=int, nargs=2, default=(3, 25), metavar=("MIN", "MAX"))
+    parser.add_argument("--choices", type=int, nargs=2, default=(2, 6), metavar=("MIN", "MAX"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", default="benchmark.json")
+    args = parser.parse_args()
+
+    params = {'forms': args.forms, 'fields': args.fields, 'matrix_groups': args.matrix_groups,
+              'matrix_rows': args.matrix_rows, 'label_words': list(args.label_words),
+              'choices': list(args.choices), 'seed': args.seed}
+    with tempfile.TemporaryDirectory() as data_dir:
+        dictionary_path = os.path.join(data_dir, "synthetic_dictionary.csv")
+        params['rows'] = generate_dictionary(dictionary_path, args.forms, args.fields, args.matrix_groups,
+                                             args.matrix_rows, args.label_words, args.choices, args.seed)
+        results = [benchmark_script(script, dictionary_path, args.repeat) for script in args.scripts]
+
+    with open(args.output, 'w') as f:
+        json.dump({'dictionary': params, 'results': results}, f, indent=2)
+    for result in results:
+        print(result['script'])
+        for name, seconds in result['stages'].items():
+            print(f"  {name:<15} {seconds:8.4f} s")
+    print(f"Benchmark results saved to {args.output}")
@@ -0,0 +1 @@
+from .api import DEFAULT_OPTIONS, generate, version_number
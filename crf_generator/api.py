@@ -0,0 +1,35 @@
+version_number = "v0.41"  # Define version number here for easy updates
+
+# Everything generate() accepts in its options dict, with the defaults the CLI uses
+DEFAULT_OPTIONS = {
+    'workers': 1,
+    'single_pass': False,
+    'form_files': True,
+    'cache_dir': None,
+    'stream': False,
+    'report_file': None,
+    'profile_file': None,
+    'output_dir': ".",
+    'version_number': version_number,
+    'engine': "csv",
+    'page_range_size': 0,
+    'optimize': False,
+    'fillable': False,
+    'site_profile': None,
+    'annotate_logic': False,
+    'exports': (),
+}
+
+def generate(dictionary, options=None):
+    """
+    Renders the CRFs for a REDCap data dictionary and returns the run report.
+    dictionary is a CSV path or a pandas DataFrame with the REDCap export headers, and options
+    overrides any of DEFAULT_OPTIONS. Nothing heavy is imported until this is called.
+    """
+    options = dict(options or {})
+    unknown = sorted(set(options) - set(DEFAULT_OPTIONS))
+    if unknown:
+        raise ValueError(f"Unknown options: {', '.join(unknown)}")
+
+    from .pipeline import create_pdfs_from_csv
+    return create_pdfs_from_csv(dictionary, **{**DEFAULT_OPTIONS, **options})
@@ -0,0 +1,159 @@
+import html
+import os
+import time
+import zipfile
+from xml.sax.saxutils import escape
+
+from reportlab.lib.pagesizes import letter
+
+from .fields import TYPE_CHECKBOX, TYPE_NOTES, TYPE_RADIO, TYPE_TEXT
+from .layout import group_fields
+from .templates import WIDGETS
+
+# Review copies written next to the PDFs. A backend is write(fields, form_name, pages, path):
+# it gets the form's Field records and its finished layout_form() pages, so a run parses the
+# dictionary and lays each form out once however many formats it writes.
+
+def svg_ops(ops):
+    # The same drawing ops paint_ops sends to reportlab, as SVG elements (y flipped)
+    height = letter[1]
+    stroke = 'fill="none" stroke="#000"'
+    elements = []
+    font = ("Helvetica", 12)
+    fill = ''
+    for op in ops:
+        kind = op[0]
+        if kind == 'font':
+            font = op[1:]
+        elif kind == 'color':
+            fill = '' if op[1:] == (0, 0, 0) else f' fill="rgb({",".join(f"{255 * v:g}" for v in op[1:])})"'
+        elif kind == 'text':
+            name, size = font
+            style = (' font-weight="bold"' if 'Bold' in name else '') + (' font-style="italic"' if 'Oblique' in name else '')
+            elements.append(f'<text x="{op[1]:g}" y="{height - op[2]:g}" font-family="Helvetica,Arial,sans-serif" '
+                            f'font-size="{size}"{style}{fill}>{html.escape(op[3])}</text>')
+        elif kind == 'rect':
+            x, y, w, h = op[1:]
+            elements.append(f'<rect x="{x:g}" y="{height - y - h:g}" width="{w:g}" height="{h:g}" {stroke}/>')
+        elif kind == 'circle':
+            elements.append(f'<circle cx="{op[1]:g}" cy="{height - op[2]:g}" r="{op[3]:g}" {stroke}/>')
+        elif kind == 'widget':
+            elements.append(f'<use href="#{op[3]}" x="{op[1]:g}" y="{-op[2]:g}"/>')
+        elif kind == 'grid':
+            xs, ys = op[1:]
+            path = [f"M{x:g} {height - ys[0]:g}V{height - ys[-1]:g}" for x in xs]
+            path += [f"M{xs[0]:g} {height - y:g}H{xs[-1]:g}" for y in ys]
+            elements.append(f'<path d="{"".join(path)}" {stroke}/>')
+    return elements
+
+def widget_defs():
+    # Widgets are defined once per document and placed with <use>, like the PDF's Form XObjects.
+    # Their ops are relative to the widget origin, so they are drawn at the page bottom and
+    # moved up by the placing <use>.
+    defs = []
+    for name, (_, ops) in WIDGETS.items():
+        defs.append(f'<g id="{name}">{"".join(svg_ops(ops))}</g>')
+    return f'<svg width="0" height="0" style="position:absolute"><defs>{"".join(defs)}</defs></svg>'
+
+def write_html(fields, form_name, pages, path):
+    width, height = letter
+    title = form_name.replace('_', ' ').upper()
+    parts = ['<!DOCTYPE html>', '<html><head><meta charset="utf-8">', f'<title>{html.escape(title)}</title>',
+             '<style>body{background:#ddd}svg.page{display:block;margin:16px auto;background:#fff}</style>',
+             '</head><body>', widget_defs()]
+    for page_number, ops in enumerate(pages, start=1):
+        header = f"{title} - Page {page_number} of {len(pages)}"
+        parts.append(f'<svg class="page" width="{width:g}" height="{height:g}" viewBox="0 0 {width:g} {height:g}">')
+        parts.append(f'<text x="{width - 50:g}" y="30" font-family="Helvetica,Arial,sans-serif" font-size="10" '
+                     f'text-anchor="end">{html.escape(header)}</text>')
+        parts.extend(svg_ops(ops))
+        parts.append('</svg>')
+    parts.append('</body></html>')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(parts))
+
+DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>')
+DOCX_RELATIONSHIPS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="word/document.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+    '</Relationships>')
+DOCX_NAMESPACE = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+def docx_paragraph(text, size=12, bold=False, italic=False, space_after=0):
+    style = ('<w:b/>' if bold else '') + ('<w:i/>' if italic else '') + f'<w:sz w:val="{size * 2}"/>'
+    return (f'<w:p><w:pPr><w:spacing w:before="0" w:after="{space_after * 20}"/></w:pPr>'
+            f'<w:r><w:rPr>{style}</w:rPr><w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p>')
+
+def docx_table(rows):
+    # rows of cell texts; the first row is the header
+    border = '<w:{0} w:val="single" w:sz="4" w:space="0" w:color="000000"/>'
+    borders = ''.join(border.format(side) for side in ('top', 'left', 'bottom', 'right', 'insideH', 'insideV'))
+    cells = lambda row, bold: ''.join(f'<w:tc>{docx_paragraph(text, 10, bold)}</w:tc>' for text in row)
+    body = ''.join(f'<w:tr>{cells(row, i == 0)}</w:tr>' for i, row in enumerate(rows))
+    return f'<w:tbl><w:tblPr><w:tblBorders>{borders}</w:tblBorders></w:tblPr>{body}</w:tbl>'
+
+def docx_question(field):
+    blocks = [docx_paragraph(field.question, 12)]
+    if field.condition:
+        blocks.append(docx_paragraph(field.condition, 9, italic=True))
+    if field.type_code == TYPE_TEXT:
+        blocks.append(docx_paragraph("_" * 60, 10))
+    elif field.type_code == TYPE_NOTES:
+        blocks.extend(docx_paragraph("_" * 80, 10) for _ in range(5))
+    elif field.type_code in (TYPE_RADIO, TYPE_CHECKBOX):
+        mark = "○" if field.type_code == TYPE_RADIO else "☐"
+        blocks.extend(docx_paragraph(f"{mark} {label}", 10) for _, label in field.choices)
+    blocks.append(docx_paragraph("", 6))
+    return blocks
+
+def write_docx(fields, form_name, pages, path):
+    # A flowing review copy: Word lays out the questions itself, so only the Field order is used
+    blocks = [docx_paragraph(form_name.replace('_', ' ').upper(), 16, bold=True, space_after=12)]
+    matrices, questions = group_fields(fields)
+    for matrix_name, group in matrices:
+        blocks.append(docx_paragraph(matrix_name, 12, space_after=4))
+        mark = "○" if group[0].type_code == TYPE_RADIO else "☐"
+        rows = [["Question"] + [label for _, label in group[0].choices]]
+        for field in group:
+            question = f"{field.question} ({field.condition})" if field.condition else field.question
+            rows.append([question] + [mark] * len(group[0].choices))
+        blocks.append(docx_table(rows))
+        blocks.append(docx_paragraph("", 6))
+    for field in questions:
+        blocks.extend(docx_question(field))
+    document = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:document xmlns:w="{DOCX_NAMESPACE}">'
+                f'<w:body>{"".join(blocks)}</w:body></w:document>')
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr('[Content_Types].xml', DOCX_CONTENT_TYPES)
+        docx.writestr('_rels/.rels', DOCX_RELATIONSHIPS)
+        docx.writestr('word/document.xml', document)
+
+# Output format -> (file extension, backend)
+BACKENDS = {
+    'html': ('.html', write_html),
+    'docx': ('.docx', write_docx),
+}
+
+def export_form(fields, form_name, pages, output_pdf, formats):
+    """
+    Writes the form in each of formats next to its PDF, named like it, and returns
+    {format: {'output': path, 'bytes': size, 'seconds': time}} for the run report.
+    """
+    exports = {}
+    for output_format in formats:
+        extension, write = BACKENDS[output_format]
+        path = os.path.splitext(output_pdf)[0] + extension
+        start = time.perf_counter()
+        write(fields, form_name, pages, path)
+        exports[output_format] = {'output': path, 'bytes': os.path.getsize(path),
+                                  'seconds': time.perf_counter() - start}
+    return exports
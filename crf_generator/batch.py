@@ -0,0 +1,81 @@
+import argparse
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from .api import generate
+
+async def generate_batch(studies, options=None, concurrency=4, executor=None, on_event=None):
+    """
+    Generates the CRFs for many studies at once and yields one result per study as it finishes.
+    studies maps a study name to its data dictionary (a CSV path or DataFrame). Each study runs
+    generate() in the executor, at most `concurrency` at a time, and writes under
+    options['output_dir']/<study name>. A failing study yields {'ok': False, 'error': ...} and
+    does not stop the others. on_event, if given, is called with a dict for every queued,
+    started, finished and failed event.
+    """
+    studies = dict(studies)
+    options = dict(options or {})
+    base_dir = options.pop('output_dir', ".")
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    def emit(study, event, **details):
+        if on_event is not None:
+            on_event({'study': study, 'event': event, **details})
+
+    async def run_study(study, dictionary):
+        async with semaphore:
+            emit(study, 'started')
+            study_options = {**options, 'output_dir': os.path.join(base_dir, study)}
+            try:
+                report = await loop.run_in_executor(executor, generate, dictionary, study_options)
+            except Exception as e:
+                emit(study, 'failed', error=f"{type(e).__name__}: {e}")
+                return {'study': study, 'ok': False, 'error': f"{type(e).__name__}: {e}"}
+            emit(study, 'finished', forms=len(report['forms']), seconds=report['total_seconds'])
+            return {'study': study, 'ok': True, 'report': report}
+
+    for study in studies:
+        emit(study, 'queued')
+    tasks = [asyncio.ensure_future(run_study(study, dictionary)) for study, dictionary in studies.items()]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for task in tasks:
+            task.cancel()
+        if own_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+async def run_batch(studies, options=None, concurrency=4, on_event=None):
+    # Collects generate_batch results in completion order
+    return [result async for result in generate_batch(studies, options, concurrency, on_event=on_event)]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="crf_generator.batch",
+                                     description="Generate CRFs for many studies concurrently.")
+    parser.add_argument("csv_files", nargs="+", help="One data dictionary per study; the file name is the study name")
+    parser.add_argument("--concurrency", type=int, default=4, help="Studies rendered at the same time")
+    parser.add_argument("--output-dir", default=".", help="Each study is written to a subdirectory of this")
+    parser.add_argument("--single-pass", action="store_true")
+    args = parser.parse_args(argv)
+
+    studies = {os.path.splitext(os.path.basename(path))[0]: path for path in args.csv_files}
+    options = {'output_dir': args.output_dir, 'single_pass': args.single_pass}
+
+    def print_event(event):
+        details = ', '.join(f"{k}={v}" for k, v in event.items() if k not in ('study', 'event'))
+        print(f"[{event['study']}] {event['event']}" + (f" ({details})" if details else ""))
+
+    results = asyncio.run(run_batch(studies, options, args.concurrency, print_event))
+    failed = [result['study'] for result in results if not result['ok']]
+    print(f"{len(results) - len(failed)} of {len(results)} studies generated")
+    if failed:
+        raise SystemExit(f"Failed studies: {', '.join(failed)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import hashlib
+import os
+import shutil
+
+from reportlab.lib.pagesizes import letter
+
+# Part of every form cache key. Bump "layout" whenever layout_form or paint_form draw differently.
+RENDERER_SETTINGS = {"pagesize": letter, "font": "Helvetica", "layout": 5}
+
+def form_cache_key(form_name, form_fields, version_number, fillable=False):
+    """
+    Content address of a rendered form: its Field records, the renderer settings and the
+    version number printed on the CRFs. Identical inputs always give the same PDF.
+    """
+    settings = sorted({**RENDERER_SETTINGS, 'fillable': fillable}.items())
+    content = repr((version_number, settings, form_name,
+                    [tuple(map(str, field)) for field in form_fields]))
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def store_in_cache(path, cache_path):
+    # Copy then rename, so an interrupted run never leaves a truncated PDF in the cache
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    shutil.copyfile(path, temp_path)
+    os.replace(temp_path, cache_path)
@@ -0,0 +1,52 @@
+import argparse
+
+from .api import DEFAULT_OPTIONS, generate, version_number
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="crf_generator",
+                                     description="Generate CRF PDFs from a REDCap data dictionary.")
+    parser.add_argument("csv_file", nargs="?", default="test.csv")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of processes used to render forms (1 renders serially)")
+    parser.add_argument("--single-pass", action="store_true",
+                        help="Draw the combined PDF on one canvas instead of merging the per-form files")
+    parser.add_argument("--no-form-files", dest="form_files", action="store_false",
+                        help="Skip the per-form PDFs (requires --single-pass)")
+    parser.add_argument("--cache-dir",
+                        help="Reuse form PDFs whose fields and settings are unchanged since a previous run")
+    parser.add_argument("--stream", action="store_true",
+                        help="Render each form as soon as its rows are read (forms must be contiguous in the CSV)")
+    parser.add_argument("--report", dest="report_file",
+                        help="Write per-form timings, pages, fields and bytes to this JSON file")
+    parser.add_argument("--profile", dest="profile_file",
+                        help="Dump cProfile stats for the run to this file (view with python -m pstats)")
+    parser.add_argument("--output-dir", default=".", help="Directory the PDFs are written to")
+    parser.add_argument("--version-number", default=version_number,
+                        help="Version printed in the output file names")
+    parser.add_argument("--engine", choices=("csv", "pandas"), default="csv",
+                        help="Read the dictionary with the csv module (fast startup) or with pandas")
+    parser.add_argument("--page-range-size", type=int, default=0,
+                        help="Paint forms longer than this many pages as page ranges in parallel (needs --workers)")
+    parser.add_argument("--optimize", action="store_true",
+                        help="Share identical fonts and drawings and compress the combined PDF harder")
+    parser.add_argument("--fillable", action="store_true",
+                        help="Add fillable form fields named by REDCap variable (read back with crf_generator.fillable)")
+    parser.add_argument("--site-profile",
+                        help="JSON file of known answers; fields their branching logic hides are left out")
+    parser.add_argument("--annotate-logic", action="store_true",
+                        help="Print each field's branching logic under its question")
+    parser.add_argument("--export", dest="exports", action="append", choices=("html", "docx"),
+                        help="Also write each form in this format from the same layout (repeatable)")
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not (args.single_pass or args.form_files):
+        parser.error("--no-form-files requires --single-pass")
+    if args.single_pass and args.cache_dir:
+        parser.error("--cache-dir cannot be combined with --single-pass")
+    if args.page_range_size and args.workers <= 1:
+        parser.error("--page-range-size requires --workers greater than 1")
+    options = {name: getattr(args, name) for name in DEFAULT_OPTIONS}
+    generate(args.csv_file, options)
@@ -0,0 +1,221 @@
+import argparse
+import json
+import os
+import shutil
+import time
+from collections import Counter
+
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from .api import version_number as default_version_number
+from .fields import FIELD_COLUMNS
+from .layout import layout_form, paint_form
+from .merge import merge_pdfs
+from .pipeline import open_forms
+from .render import render_forms
+from .text import wrap_lines
+
+# Highlight colors of the change summary
+ADDED_COLOR = (0, 0.45, 0)
+REMOVED_COLOR = (0.75, 0, 0)
+OLD_VALUE_COLOR = (0.45, 0.45, 0.45)
+BLACK = (0, 0, 0)
+
+def column_text(column, value):
+    if column == 'choices':
+        return " | ".join(f"{code}, {label}" for code, label in value)
+    return '' if value is None else str(value)
+
+def diff_forms(old_forms, new_forms):
+    """
+    Compares two dictionaries, given as (form_name, list of Field) pairs, field by field keyed by
+    (form, variable_name). Returns a dict of
+      added / removed: [{'form', 'variable_name', 'question'}]
+      modified: [{'form', 'variable_name', 'changes': {column: [old text, new text]}}]
+      reordered_forms: forms whose fields are the same but in a different order
+      changed_forms / unchanged_forms / removed_forms: form names, in the new dictionary's order
+    Anything that changes a form's layout lands it in changed_forms.
+    """
+    old_forms, new_forms = dict(old_forms), dict(new_forms)
+    changes = {'added': [], 'removed': [], 'modified': [], 'reordered_forms': [],
+               'changed_forms': [], 'unchanged_forms': [],
+               'removed_forms': [form_name for form_name in old_forms if form_name not in new_forms]}
+    for form_name in old_forms:
+        if form_name not in new_forms:
+            changes['removed'].extend({'form': form_name, 'variable_name': field.variable_name,
+                                       'question': field.question} for field in old_forms[form_name])
+    for form_name, fields in new_forms.items():
+        old_fields = old_forms.get(form_name, [])
+        if old_fields == fields:
+            changes['unchanged_forms'].append(form_name)
+            continue
+        changes['changed_forms'].append(form_name)
+        old_by_name = {field.variable_name: field for field in old_fields}
+        new_by_name = {field.variable_name: field for field in fields}
+        for field in fields:
+            old_field = old_by_name.get(field.variable_name)
+            if old_field is None:
+                changes['added'].append({'form': form_name, 'variable_name': field.variable_name,
+                                         'question': field.question})
+            elif old_field != field:
+                changes['modified'].append({
+                    'form': form_name, 'variable_name': field.variable_name,
+                    'changes': {column: [column_text(column, old), column_text(column, new)]
+                                for column, old, new in zip(FIELD_COLUMNS, old_field, field) if old != new}})
+        changes['removed'].extend({'form': form_name, 'variable_name': field.variable_name,
+                                   'question': field.question}
+                                  for field in old_fields if field.variable_name not in new_by_name)
+        if Counter(old_fields) == Counter(fields):
+            changes['reordered_forms'].append(form_name)
+    return changes
+
+def changed_pages(old_fields, new_pages, form_name):
+    # Page numbers of the new layout that differ from the same page of the old one
+    old_pages = layout_form(old_fields, form_name) if old_fields else []
+    pages = [number for number, ops in enumerate(new_pages, start=1)
+             if number > len(old_pages) or old_pages[number - 1] != ops]
+    return {'pages': pages, 'old_page_count': len(old_pages), 'new_page_count': len(new_pages)}
+
+def layout_change_summary(changes, title):
+    """
+    Lays out the change summary as pages of drawing ops, like layout_form: one section per form
+    with its added fields in green, removed ones in red and, for each modified column, the old
+    value in grey above the new one in bold.
+    """
+    width, height = letter
+    margin = 50
+    text_width = width - 2 * margin
+    page_top = height - 70
+    pages = [[('font', "Helvetica-Bold", 16), ('text', margin, page_top, title)]]
+    y = page_top - 30
+
+    def line(text, font="Helvetica", size=10, color=BLACK, indent=0, step=13):
+        nonlocal y
+        for wrapped in wrap_lines(text, font, size, text_width - indent) or ('',):
+            if y < margin:
+                pages.append([])
+                y = page_top
+            pages[-1].extend([('font', font, size), ('color', *color), ('text', margin + indent, y, wrapped)])
+            y -= step
+
+    counts = (f"{len(changes['added'])} added, {len(changes['removed'])} removed, "
+              f"{len(changes['modified'])} modified fields in {len(changes['changed_forms'])} forms; "
+              f"{len(changes['unchanged_forms'])} forms unchanged")
+    line(counts, step=24)
+    by_form = {}
+    for kind in ('added', 'removed', 'modified'):
+        for entry in changes[kind]:
+            by_form.setdefault(entry['form'], []).append((kind, entry))
+    for form_name in changes['changed_forms'] + changes['removed_forms']:
+        heading = form_name.replace('_', ' ').upper()
+        if form_name in changes['removed_forms']:
+            heading += " (form removed)"
+        elif form_name in changes.get('pages', {}):
+            pages_info = changes['pages'][form_name]
+            numbers = ", ".join(map(str, pages_info['pages'])) or "none"
+            heading += f" - pages changed: {numbers} of {pages_info['new_page_count']}"
+        if form_name in changes['reordered_forms']:
+            heading += " (fields reordered)"
+        line(heading, "Helvetica-Bold", 12, step=18)
+        for kind, entry in by_form.get(form_name, []):
+            if kind == 'added':
+                line(f"+ {entry['variable_name']}: {entry['question']}", color=ADDED_COLOR, indent=10)
+            elif kind == 'removed':
+                line(f"- {entry['variable_name']}: {entry['question']}", color=REMOVED_COLOR, indent=10)
+            else:
+                for column, (old, new) in entry['changes'].items():
+                    line(f"~ {entry['variable_name']} {column.replace('_', ' ')}", indent=10)
+                    line(f"was: {old or '(blank)'}", "Helvetica-Oblique", 9, OLD_VALUE_COLOR, indent=24, step=12)
+                    line(f"now: {new or '(blank)'}", "Helvetica-Bold", 9, indent=24, step=12)
+        y -= 10
+    return pages
+
+def write_change_summary(changes, output_pdf, title="CHANGE SUMMARY"):
+    pages = layout_change_summary(changes, title)
+    c = canvas.Canvas(output_pdf, pagesize=letter)
+    paint_form(c, pages, "change_summary")
+    c.save()
+    return len(pages)
+
+def render_changes(old_dictionary, new_dictionary, output_dir=".", previous_dir=None, previous_version=None,
+                   version_number=default_version_number, workers=1, summary=True, report_file=None):
+    """
+    Brings the CRFs of one data dictionary CSV up to date with a revised one. Only the forms the
+    diff marks as changed are rendered again; the others are taken from the previous run's PDFs in
+    previous_dir (default output_dir), named with previous_version (default version_number),
+    which must have been rendered with the same settings. A form whose previous PDF is missing
+    is rendered too. summary writes the change summary PDF and puts it in front of the combined
+    PDF. Returns the run report with the diff, as diff_forms describes it.
+    """
+    start = time.perf_counter()
+    previous_dir = previous_dir or output_dir
+    previous_version = previous_version or version_number
+    old_forms = list(open_forms(old_dictionary, False, "csv"))
+    new_forms = list(open_forms(new_dictionary, False, "csv"))
+    changes = diff_forms(old_forms, new_forms)
+    old_by_name = dict(old_forms)
+    # The new layouts are compared here and then painted, so changed forms are laid out once
+    layouts = {form_name: layout_form(fields, form_name) for form_name, fields in new_forms
+               if form_name in changes['changed_forms']}
+    changes['pages'] = {form_name: changed_pages(old_by_name.get(form_name), pages, form_name)
+                        for form_name, pages in layouts.items()}
+    os.makedirs(output_dir, exist_ok=True)
+
+    report = {'old_dictionary': os.fspath(old_dictionary), 'new_dictionary': os.fspath(new_dictionary),
+              'version_number': version_number, 'changes': changes, 'rendered': [], 'reused': []}
+    pdf_files = []
+    jobs = []
+    for form_name, fields in new_forms:
+        output_pdf = os.path.join(output_dir, f"{form_name}_{version_number}.pdf")
+        previous_pdf = os.path.join(previous_dir, f"{form_name}_{previous_version}.pdf")
+        pdf_files.append(output_pdf)
+        if form_name in changes['unchanged_forms'] and os.path.exists(previous_pdf):
+            if os.path.abspath(previous_pdf) != os.path.abspath(output_pdf):
+                shutil.copyfile(previous_pdf, output_pdf)
+            report['reused'].append(form_name)
+        elif form_name in layouts:
+            jobs.append((fields, form_name, output_pdf, layouts[form_name]))
+        else:
+            jobs.append((fields, form_name, output_pdf))
+    for stats in render_forms(jobs, workers):
+        report['rendered'].append(stats)
+        print(f"PDF for form '{stats['form']}' saved to {stats['output_pdf']}")
+
+    if summary:
+        summary_pdf = os.path.join(output_dir, f"change_summary_{version_number}.pdf")
+        report['summary_pages'] = write_change_summary(changes, summary_pdf)
+        report['summary_pdf'] = summary_pdf
+        pdf_files.insert(0, summary_pdf)
+        print(f"Change summary saved to {summary_pdf}")
+    combined_pdf = os.path.join(output_dir, f"combined_forms_{version_number}.pdf")
+    merge_pdfs(pdf_files, combined_pdf)
+    report['combined_pdf'] = combined_pdf
+    report['total_seconds'] = time.perf_counter() - start
+    print(f"{len(report['rendered'])} forms rendered, {len(report['reused'])} reused; "
+          f"combined PDF saved to {combined_pdf}")
+    if report_file:
+        with open(report_file, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Run report saved to {report_file}")
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="crf_generator.diff",
+                                     description="Re-render only the CRFs a revised data dictionary changes.")
+    parser.add_argument("old_csv", help="Data dictionary the previous PDFs were rendered from")
+    parser.add_argument("new_csv", help="Revised data dictionary")
+    parser.add_argument("--output-dir", default=".")
+    parser.add_argument("--previous-dir", help="Where the previous PDFs are (default: --output-dir)")
+    parser.add_argument("--previous-version", help="Version in the previous PDFs' names (default: --version-number)")
+    parser.add_argument("--version-number", default=default_version_number)
+    parser.add_argument("--workers", type=int, default=1, help="Processes used to render the changed forms")
+    parser.add_argument("--no-summary", dest="summary", action="store_false",
+                        help="Skip the change summary PDF")
+    parser.add_argument("--report", dest="report_file", help="Write the diff and run report to this JSON file")
+    args = parser.parse_args(argv)
+    render_changes(args.old_csv, args.new_csv, args.output_dir, args.previous_dir, args.previous_version,
+                   args.version_number, args.workers, args.summary, args.report_file)
+
+if __name__ == "__main__":
+    main()
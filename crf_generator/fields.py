@@ -0,0 +1,114 @@
+import csv
+import re
+from collections import namedtuple
+
+# Integer field type codes used by the preprocessed field table
+TYPE_OTHER, TYPE_TEXT, TYPE_NOTES, TYPE_RADIO, TYPE_CHECKBOX = range(5)
+TYPE_CODES = {"text": TYPE_TEXT, "notes": TYPE_NOTES, "radio": TYPE_RADIO, "checkbox": TYPE_CHECKBOX}
+FIELD_COLUMNS = ['variable_name', 'matrix_name', 'question', 'type_code', 'choices', 'branching_logic', 'condition']
+
+# One field of a form, as the renderers see it. A namedtuple has no per-instance dict, unpacks
+# like the plain tuples it replaces and pickles compactly for the worker pool.
+# condition is the readable branching logic printed under the question; readers leave it None
+# and logic.annotate_forms fills it in.
+Field = namedtuple('Field', FIELD_COLUMNS)
+
+# REDCap data dictionary headers and the names the renderers use for them
+CSV_COLUMNS = {  # Update this mapping according to your CSV structure
+    'Variable / Field Name': 'variable_name',
+    'Form Name': 'form',
+    'Section Header': 'section_header',
+    'Field Type': 'type',
+    'Field Label': 'question',
+    'Choices, Calculations, OR Slider Labels': 'choice',
+    'Field Note': 'field_note',
+    'Text Validation Type OR Show Slider Number': 'validation_type',
+    'Text Validation Min': 'validation_min',
+    'Text Validation Max': 'validation_max',
+    'Identifier?': 'identifier',
+    'Branching Logic (Show field only if...)': 'branching_logic',
+    'Required Field?': 'required_field',
+    'Custom Alignment': 'custom_alignment',
+    'Question Number (surveys only)': 'question_number',
+    'Matrix Group Name': 'matrix_name',
+    'Matrix Ranking?': 'matrix_ranking',
+    'Field Annotation': 'field_annotation'
+}
+
+DIV_TAGS = re.compile(r'<div[^>]*>|</div>')
+
+def parse_choice_string(choice):
+    """
+    Splits one REDCap "value, label | value, label" cell into a tuple of (value, label) pairs.
+    """
+    pairs = []
+    for option in choice.split('|'):
+        option = option.strip()
+        if not option:
+            continue
+        value, comma, label = option.partition(',')
+        # An option without a comma is its own label
+        pairs.append((value.strip(), label.strip() if comma else value.strip()))
+    return tuple(pairs)
+
+def field_from_row(row):
+    """
+    Builds the Field for one renamed CSV row. Same result as frames.preprocess_fields,
+    without pandas.
+    """
+    return Field(
+        row.get('variable_name') or '',
+        row.get('matrix_name') or None,
+        DIV_TAGS.sub('', row.get('question') or ''),
+        TYPE_CODES.get(row.get('type'), TYPE_OTHER),
+        parse_choice_string(row.get('choice') or ''),
+        row.get('branching_logic') or None,
+        None,
+    )
+
+def read_rows(csv_file):
+    # csv_file is a path or an open text file; REDCap exports may start with a byte order mark
+    if hasattr(csv_file, 'read'):
+        yield from rename_rows(csv.DictReader(csv_file))
+        return
+    with open(csv_file, newline='', encoding='utf-8-sig') as f:
+        yield from rename_rows(csv.DictReader(f))
+
+def rename_rows(reader):
+    for row in reader:
+        yield {CSV_COLUMNS.get(column, column): value for column, value in row.items()}
+
+def read_forms_csv(csv_file):
+    # Groups the whole dictionary by form name, so forms may be spread over the file
+    forms = {}
+    for row in read_rows(csv_file):
+        if row.get('form'):
+            forms.setdefault(row['form'], []).append(field_from_row(row))
+    for form_name in sorted(forms):
+        yield form_name, forms[form_name]
+
+def stream_forms_csv(csv_file):
+    """
+    Yields (form_name, list of Field) one form at a time while the CSV is still being read.
+    REDCap exports keep each form's rows together; a form that shows up again after another
+    one started raises ValueError, and read_forms_csv has to be used instead.
+    """
+    finished = set()
+    current_form = None
+    current_fields = []
+    for row in read_rows(csv_file):
+        form_name = row.get('form')
+        if not form_name:
+            continue
+        if form_name != current_form:
+            if current_form is not None:
+                yield current_form, current_fields
+                finished.add(current_form)
+            if form_name in finished:
+                raise ValueError(f"Form '{form_name}' is not contiguous in {csv_file}; "
+                                 "read it without streaming so forms are grouped")
+            current_form = form_name
+            current_fields = []
+        current_fields.append(field_from_row(row))
+    if current_form is not None:
+        yield current_form, current_fields
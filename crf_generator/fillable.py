@@ -0,0 +1,118 @@
+import argparse
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+RADIO_FLAG = 1 << 15  # /Ff bit that marks a button field as a radio group
+
+# Fields have no border or background of their own: the printed boxes and circles underneath
+# already show where to write, so a fillable CRF still prints like the paper one
+FIELD_STYLE = {'borderColor': None, 'fillColor': None, 'borderWidth': 0}
+
+def checkbox_column(variable_name, value):
+    # REDCap imports one 0/1 column per checkbox option
+    return f"{variable_name}___{value}"
+
+# reportlab's undocumented AcroForm methods that build appearance streams (as of reportlab 5.0)
+APPEARANCE_BUILDERS = ('checkboxAP', 'txAP')
+
+def share_appearances(form):
+    """
+    reportlab builds every button's and text box's appearance streams from scratch and only then
+    finds it already wrote an identical one. All fields of a kind look alike here, so each
+    appearance is built once per canvas and handed back for the rest. This wraps undocumented
+    reportlab methods, so a reportlab without them is left as it is: fields are then only
+    slower to add, and look the same.
+    """
+    if getattr(form, 'shared_appearances', None) is not None:
+        return
+    if not all(callable(getattr(form, method_name, None)) for method_name in APPEARANCE_BUILDERS):
+        return
+    form.shared_appearances = {}
+    for method_name in APPEARANCE_BUILDERS:
+        build = getattr(form, method_name)
+
+        def cached(*args, build=build, **kwargs):
+            key = (build.__name__, repr(args), repr(sorted(kwargs.items())))
+            if key not in form.shared_appearances:
+                form.shared_appearances[key] = build(*args, **kwargs)
+            return form.shared_appearances[key]
+
+        setattr(form, method_name, cached)
+
+def add_inputs(c, inputs):
+    """
+    Adds one page's AcroForm fields in a batch, named by REDCap variable_name: text boxes for text
+    and notes fields, a radio group per radio field and a checkbox per checkbox option. inputs
+    are the (x, y, width, height, kind, name, value) of the page's 'input' ops.
+    """
+    form = c.acroForm
+    share_appearances(form)
+    for x, y, width, height, kind, name, value in inputs:
+        if kind == 'radio':
+            form.radio(name=name, value=value, x=x, y=y, size=width, fieldFlags='noToggleToOff radio',
+                       **FIELD_STYLE)
+        elif kind == 'checkbox':
+            form.checkbox(name=checkbox_column(name, value), x=x, y=y, size=width, fieldFlags='',
+                          **FIELD_STYLE)
+        else:
+            form.textfield(name=name, x=x, y=y, width=width, height=height, fontSize=10, maxlen=None,
+                           fieldFlags='multiline' if kind == 'notes' else '', **FIELD_STYLE)
+
+def read_filled_values(pdf_file):
+    """
+    Returns {column: value} for the AcroForm fields of a filled CRF, in REDCap import form:
+    text as typed, the chosen code for radio groups and 1/0 for checkbox options.
+    """
+    from PyPDF2 import PdfReader
+
+    values = {}
+    for name, field in (PdfReader(pdf_file).get_fields() or {}).items():
+        value = field.get('/V')
+        if field.get('/FT') != '/Btn':
+            values[name] = '' if value is None else str(value)
+        elif field.get('/Ff', 0) & RADIO_FLAG:
+            values[name] = '' if value in (None, '/Off') else str(value).lstrip('/')
+        else:
+            values[name] = '0' if value in (None, '/Off') else '1'
+    return values
+
+def extract_to_csv(pdf_files, output_csv, id_field='record_id', workers=1):
+    """
+    Reads the values of many filled CRFs and writes them as one REDCap import CSV, a row per PDF.
+    A PDF without an id_field of its own is given its file name as the record id. Returns the
+    number of rows written.
+    """
+    pdf_files = list(pdf_files)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            rows = list(executor.map(read_filled_values, pdf_files, chunksize=16))
+    else:
+        rows = list(map(read_filled_values, pdf_files))
+
+    columns = [id_field]
+    for pdf_file, row in zip(pdf_files, rows):
+        if not row.get(id_field):
+            row[id_field] = os.path.splitext(os.path.basename(pdf_file))[0]
+        for column in row:
+            if column not in columns:
+                columns.append(column)
+    with open(output_csv, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    return len(rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="crf_generator.fillable",
+                                     description="Collect the values of filled CRF PDFs into a REDCap import CSV.")
+    parser.add_argument("pdf_files", nargs="+", help="Filled fillable CRFs, one record each")
+    parser.add_argument("--output", default="redcap_import.csv")
+    parser.add_argument("--id-field", default="record_id", help="Record ID column of the REDCap project")
+    parser.add_argument("--workers", type=int, default=1, help="Processes used to read the PDFs")
+    args = parser.parse_args(argv)
+    rows = extract_to_csv(args.pdf_files, args.output, args.id_field, args.workers)
+    print(f"{rows} records saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import pandas as pd
+
+from .fields import CSV_COLUMNS, FIELD_COLUMNS, TYPE_CODES, TYPE_OTHER, Field
+
+def parse_choices(choice_column):
+    """
+    Splits REDCap "value, label | value, label" strings into tuples of (value, label) pairs.
+    """
+    options = choice_column.dropna().astype(str).str.split('|').explode().str.strip()
+    options = options[options != '']
+    if options.empty:
+        return pd.Series([()] * len(choice_column), index=choice_column.index, dtype=object)
+    pairs = options.str.split(',', n=1, expand=True).reindex(columns=[0, 1])
+    values = pairs[0].str.strip()
+    labels = pairs[1].fillna(pairs[0]).astype(str).str.strip()  # An option without a comma is its own label
+    parsed = pd.Series(list(zip(values, labels)), index=options.index, dtype=object)
+    parsed = parsed.groupby(level=0, sort=False).agg(tuple)
+    return parsed.reindex(choice_column.index).apply(lambda c: c if isinstance(c, tuple) else ())
+
+def preprocess_fields(data):
+    """
+    Turns the renamed data dictionary into a compact field table in one column-wise pass:
+    cleaned labels, parsed choices and integer type codes. form_field_tuples turns its rows
+    into the Field records the renderers walk.
+    """
+    fields = pd.DataFrame(index=data.index)
+    fields['form'] = data['form']
+    fields['variable_name'] = data['variable_name']
+    fields['matrix_name'] = data['matrix_name'].astype(object).where(data['matrix_name'].notna(), None)
+    fields['question'] = (data['question'].fillna('').astype(str)
+                          .str.replace(r'<div[^>]*>|</div>', '', regex=True))
+    fields['type_code'] = data['type'].map(TYPE_CODES).fillna(TYPE_OTHER).astype('int8')
+    fields['choices'] = parse_choices(data['choice'])
+    fields['branching_logic'] = data['branching_logic'].astype(object).where(data['branching_logic'].notna(), None)
+    fields['condition'] = None
+    return fields
+
+def form_field_tuples(fields):
+    # tolist() hands back Python scalars, so records match the csv engine's exactly
+    return list(map(Field._make, zip(*(fields[column].tolist() for column in FIELD_COLUMNS))))
+
+def read_forms(dictionary):
+    # Loads the whole dictionary (a CSV path or a DataFrame with REDCap headers) and groups it
+    data = pd.read_csv(dictionary) if isinstance(dictionary, str) else dictionary
+    data = data.rename(columns=CSV_COLUMNS)
+    fields = preprocess_fields(data)
+    for form_name, form_fields in fields.groupby('form'):
+        yield form_name, form_field_tuples(form_fields)
+
+def stream_forms(csv_file, chunksize=1000):
+    """
+    Yields (form_name, list of Field) one form at a time while the CSV is still being read.
+    REDCap exports keep each form's rows together; a form that shows up again after another
+    one started raises ValueError, and read_forms has to be used instead.
+    """
+    finished = set()
+    current_form = None
+    current_fields = []
+    for chunk in pd.read_csv(csv_file, chunksize=chunksize):
+        chunk.rename(columns=CSV_COLUMNS, inplace=True)
+        fields = preprocess_fields(chunk)
+        run_ids = (fields['form'] != fields['form'].shift()).cumsum()
+        for _, run in fields.groupby(run_ids, sort=False):
+            form_name = run['form'].iloc[0]
+            if form_name != current_form:
+                if current_form is not None:
+                    yield current_form, current_fields
+                    finished.add(current_form)
+                if form_name in finished:
+                    raise ValueError(f"Form '{form_name}' is not contiguous in {csv_file}; "
+                                     "read it without streaming so forms are grouped")
+                current_form = form_name
+                current_fields = []
+            current_fields.extend(form_field_tuples(run))
+    if current_form is not None:
+        yield current_form, current_fields
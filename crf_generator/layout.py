@@ -0,0 +1,269 @@
+from reportlab.lib.pagesizes import letter
+
+from .fields import TYPE_CHECKBOX, TYPE_NOTES, TYPE_RADIO, TYPE_TEXT
+from .fillable import add_inputs
+from .templates import paint_widget
+from .text import LAYOUT_LINES, string_width
+
+def measure_question(field, margin, text_width, wrapped):
+    """
+    Builds the drawing ops for one question and returns (height, pieces): a (height, ops) pair
+    per label line, choice or input box, with ops relative to the piece's top edge (y = 0,
+    growing down as negative offsets). A question taller than a page breaks between pieces.
+    Nothing is drawn here. wrapped holds the form's lines, from wrap_form_texts.
+    """
+    variable_name, type_code, choices = field.variable_name, field.type_code, field.choices
+    ops = [('font', "Helvetica", 12)]
+    y = 0
+    starts = [(0, 0)]  # (y, op index) where each piece begins
+
+    def start():
+        if y != starts[-1][0]:
+            starts.append((y, len(ops)))
+
+    for line in wrapped[field.question, text_width]:
+        start()
+        ops.append(('text', margin, y, line))
+        y -= 14
+    if field.condition:
+        start()
+        ops.append(('font', "Helvetica-Oblique", 9))
+        for line in wrapped[field.condition, text_width]:
+            start()
+            ops.append(('text', margin, y, line))
+            y -= 11
+    start()
+    ops.append(('font', "Helvetica", 10))
+    # Notes stacks and radios are ('widget', x, y, name) ops painted from templates.py.
+    # ('input', x, y, width, height, kind, name, value) ops cover them for fillable output.
+    if type_code == TYPE_TEXT:
+        ops.append(('rect', margin, y - 15, text_width, 18))
+        ops.append(('input', margin, y - 15, text_width, 18, 'text', variable_name, None))
+        y -= 25
+    elif type_code == TYPE_NOTES:
+        ops.append(('widget', margin, y - 15, 'notes_box'))
+        ops.append(('input', margin, y - 103, text_width, 106, 'notes', variable_name, None))
+        y -= 110
+    elif type_code in (TYPE_RADIO, TYPE_CHECKBOX):
+        for value, label in choices:
+            start()
+            if type_code == TYPE_RADIO:
+                ops.append(('widget', margin + 10, y - 5, 'radio'))
+                ops.append(('input', margin + 6, y - 9, 8, 8, 'radio', variable_name, value))
+            else:
+                ops.append(('rect', margin + 5, y - 10, 10, 10))
+                ops.append(('input', margin + 5, y - 10, 10, 10, 'checkbox', variable_name, value))
+            ops.append(('text', margin + 20, y - 10, label))
+            y -= 15
+    y -= 10
+    starts.append((y, len(ops)))
+    pieces = [(top - bottom, place_ops(ops[first:last], -top))
+              for (top, first), (bottom, last) in zip(starts, starts[1:])]
+    return -y, pieces
+
+def matrix_widths(group, text_width):
+    # Widths of a matrix's question column and of each of its choice columns
+    question_width = 150
+    return question_width, min(70, (text_width - question_width) / max(len(group[0].choices), 1))
+
+def measure_matrix(group, margin, text_width, wrapped):
+    """
+    Measures a matrix group once and returns (columns, header_height, header_ops, rows): the x
+    positions of the grid's vertical lines, the column header row and a (height, ops) pair per
+    matrix row, with ops relative to the top edge of the header or row.
+    """
+    choice_values = [value for value, _ in group[0].choices]
+    choice_labels = [label for _, label in group[0].choices]
+    question_width, column_width = matrix_widths(group, text_width)
+    columns = [margin + question_width + column_width * i for i in range(len(choice_labels) + 1)]
+    columns.insert(0, margin)
+
+    header_ops = [('font', "Helvetica", 10), ('text', margin + 4, -12, "Question")]
+    header_lines = 1
+    for x, label in zip(columns[1:], choice_labels):
+        lines = wrapped[label, column_width - 8]
+        header_ops.extend(('text', x + 4, -12 - 12 * i, line) for i, line in enumerate(lines))
+        header_lines = max(header_lines, len(lines))
+
+    rows = []
+    for field in group:
+        lines = wrapped[field.question, question_width - 8]
+        ops = [('text', margin + 4, -12 - 12 * i, line) for i, line in enumerate(lines)]
+        text_height = 12 * len(lines)
+        if field.condition:
+            ops.append(('font', "Helvetica-Oblique", 8))
+            for line in wrapped[field.condition, question_width - 8]:
+                ops.append(('text', margin + 4, -12 - text_height, line))
+                text_height += 10
+            ops.append(('font', "Helvetica", 10))
+        height = max(20, text_height + 8)
+        # Only the marks are drawn per cell; the cell borders come from the page's grid op
+        cell = 'radio' if field.type_code == TYPE_RADIO else 'checkbox'
+        size = 8 if cell == 'radio' else 10
+        for x, value in zip(columns[1:-1], choice_values):
+            center_x, center_y = x + column_width / 2, -height / 2
+            ops.append(('widget', center_x, center_y, cell))
+            ops.append(('input', center_x - size / 2, center_y - size / 2, size, size, cell,
+                        field.variable_name, value))
+        rows.append((height, ops))
+    return columns, 12 * header_lines + 8, header_ops, rows
+
+def place_ops(ops, y):
+    # Moves block-relative ops to an absolute y position on the page
+    placed = []
+    for op in ops:
+        if op[0] == 'font':
+            placed.append(op)
+        else:
+            placed.append((op[0], op[1], y + op[2]) + op[3:])
+    return placed
+
+def group_fields(fields):
+    # Matrix groups come first, in name order, then the remaining questions in row order.
+    # Returns ([(matrix_name, fields)], questions); every output format uses this order.
+    matrices = {}
+    questions = []
+    for field in fields:
+        if field.matrix_name is None:
+            questions.append(field)
+        else:
+            matrices.setdefault(field.matrix_name, []).append(field)
+    return sorted(matrices.items()), questions
+
+def wrap_form_texts(matrices, questions, text_width):
+    """
+    Wraps every question, condition and matrix column label of a form, through the run-wide
+    LAYOUT_LINES cache: the labels earlier forms already wrapped are looked up, the rest are
+    wrapped in one wrap_texts pass per line width. Returns {(text, max_width): lines}, which the
+    measure functions read their lines from.
+    """
+    by_width = {}
+
+    def add(width, texts):
+        by_width.setdefault(width, {}).update(dict.fromkeys(text for text in texts if text is not None))
+
+    for _, group in matrices:
+        question_width, column_width = matrix_widths(group, text_width)
+        add(column_width - 8, (label for _, label in group[0].choices))
+        add(question_width - 8, (text for field in group for text in (field.question, field.condition)))
+    add(text_width, (text for field in questions for text in (field.question, field.condition)))
+    wrapped = {}
+    for width, texts in by_width.items():
+        wrapped.update(zip([(text, width) for text in texts], LAYOUT_LINES.wrap(list(texts), "Helvetica", 12, width)))
+    return wrapped
+
+def layout_form(fields, form_name):
+    """
+    Measure pass: assigns every block of a form to a page and a y position without touching
+    a canvas. Returns a list of pages, each a list of absolute drawing ops, which paint_form
+    draws and which can be kept and reused.
+    """
+    width, height = letter
+    margin = 50
+    text_width = width - 2 * margin
+    page_top = height - 70
+    page_space = page_top - margin
+
+    pages = [[('font', "Helvetica-Bold", 16), ('text', margin, page_top, form_name.replace("_", " ").upper())]]
+    y = page_top - 40
+
+    def new_page():
+        pages.append([])
+        return page_top
+
+    matrices, questions = group_fields(fields)
+    wrapped = wrap_form_texts(matrices, questions, text_width)
+    for matrix_name, group in matrices:
+        columns, header_height, header_ops, rows = measure_matrix(group, margin, text_width, wrapped)
+        title_height = 24
+        block_height = title_height + header_height + sum(height for height, _ in rows)
+        # Keep a matrix together when it fits on a page, and never leave a header without a row
+        if y != page_top and (y - block_height < margin and block_height <= page_space
+                              or y - title_height - header_height - rows[0][0] < margin):
+            y = new_page()
+        title = matrix_name
+        while rows:
+            pages[-1].extend([('font', "Helvetica", 12), ('text', margin, y, title)])
+            y -= title_height
+            row_lines = [y]
+            pages[-1].extend(place_ops(header_ops, y))
+            y -= header_height
+            row_lines.append(y)
+            # Rows fill the page; the rest carry over under a repeated header
+            while rows and (y - rows[0][0] >= margin or len(row_lines) == 2):
+                height, ops = rows.pop(0)
+                pages[-1].extend(place_ops(ops, y))
+                y -= height
+                row_lines.append(y)
+            pages[-1].append(('grid', columns, row_lines))
+            if rows:
+                y = new_page()
+                title = f"{matrix_name} (continued)"
+        # Leave room for the ascenders of whatever is drawn below the grid
+        y -= 24
+
+    for field in questions:
+        block_height, pieces = measure_question(field, margin, text_width, wrapped)
+        # Keep a question together when it fits on a page. A taller one fills the page a line or
+        # choice at a time and carries over, in the font it was set in.
+        if y - block_height < margin and y != page_top and block_height <= page_space:
+            y = new_page()
+        font = None
+        for height, ops in pieces:
+            if y - height < margin and y != page_top:
+                y = new_page()
+                if ops[0][0] != 'font':
+                    pages[-1].append(font)
+            pages[-1].extend(place_ops(ops, y))
+            y -= height
+            font = next((op for op in reversed(ops) if op[0] == 'font'), font)
+
+    return pages
+
+def draw_header(c, form_name, page_number, page_count):
+    width, height = letter
+    margin = 50
+    c.setFont("Helvetica", 10)
+    header_text = f"{form_name.replace('_', ' ').upper()} - Page {page_number} of {page_count}"
+    header_width = string_width(header_text, "Helvetica", 10)
+    c.drawString(width - margin - header_width, height - 30, header_text)
+
+def paint_grid(c, xs, ys):
+    # One path for the whole grid instead of a stroke per line or a rect per cell
+    path = c.beginPath()
+    for x in xs:
+        path.moveTo(x, ys[0])
+        path.lineTo(x, ys[-1])
+    for y in ys:
+        path.moveTo(xs[0], y)
+        path.lineTo(xs[-1], y)
+    c.drawPath(path, stroke=1, fill=0)
+
+def paint_ops(c, ops):
+    for op in ops:
+        kind = op[0]
+        if kind == 'text':
+            c.drawString(*op[1:])
+        elif kind == 'rect':
+            c.rect(*op[1:])
+        elif kind == 'circle':
+            c.circle(*op[1:])
+        elif kind == 'widget':
+            paint_widget(c, op[3], op[1], op[2])
+        elif kind == 'grid':
+            paint_grid(c, *op[1:])
+        elif kind == 'font':
+            c.setFont(*op[1:])
+        elif kind == 'color':
+            c.setFillColorRGB(*op[1:])
+
+def paint_form(c, pages, form_name, first_page=1, page_count=None, fillable=False):
+    # Paint pass: draws a finished layout; the last page is left open for the caller.
+    # A page range of a longer form passes its first page number and the form's page count.
+    for page_number, ops in enumerate(pages, start=first_page):
+        if page_number > first_page:
+            c.showPage()
+        draw_header(c, form_name, page_number, page_count or len(pages))
+        paint_ops(c, ops)
+        if fillable:
+            add_inputs(c, [op[1:] for op in ops if op[0] == 'input'])
@@ -0,0 +1,297 @@
+import re
+from functools import lru_cache
+
+# REDCap branching logic, e.g. "[smoker]='1' and ([age] >= 18 or [consent(2)] = '1')".
+# Compiled trees are plain tuples:
+#   ('ref', variable_name, checkbox_code or None)   ('value', text)
+#   ('cmp', operator, left, right)   ('and', terms)   ('or', terms)   ('not', term)
+TOKENS = re.compile(r"""\s*(?:
+    (?P<ref>(?:\[[^\[\]]+\])+)
+  | (?P<string>'[^']*'|"[^"]*")
+  | (?P<number>-?\d+(?:\.\d+)?)
+  | (?P<operator><>|!=|<=|>=|==|=|<|>)
+  | (?P<word>and|or|not)\b
+  | (?P<paren>[()])
+)""", re.VERBOSE | re.IGNORECASE)
+REFERENCE = re.compile(r'\[([^\[\]()]+)(?:\(([^()]*)\))?\]$')
+OPERATORS = {'=': '=', '==': '=', '<>': '<>', '!=': '<>', '<': '<', '>': '>', '<=': '<=', '>=': '>='}
+
+def tokenize(text):
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKENS.match(text, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"Unsupported branching logic at {text[position:position + 20]!r}")
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind).lower() if kind == 'word' else match.group(kind)))
+        position = match.end()
+    return tokens
+
+@lru_cache(maxsize=4096)
+def parse_logic(text):
+    """
+    Compiles one branching_logic cell into an expression tree. Raises ValueError for syntax this
+    compiler does not know (functions, smart variables with arguments), so the caller can treat
+    the field as always shown.
+    """
+    tokens = tokenize(text)
+    tree, position = parse_or(tokens, 0)
+    if position != len(tokens):
+        raise ValueError(f"Unexpected {tokens[position][1]!r} in branching logic {text!r}")
+    return tree
+
+def parse_or(tokens, position):
+    terms = []
+    while True:
+        term, position = parse_and(tokens, position)
+        terms.append(term)
+        if position < len(tokens) and tokens[position] == ('word', 'or'):
+            position += 1
+        else:
+            return (terms[0] if len(terms) == 1 else ('or', tuple(terms))), position
+
+def parse_and(tokens, position):
+    terms = []
+    while True:
+        term, position = parse_not(tokens, position)
+        terms.append(term)
+        if position < len(tokens) and tokens[position] == ('word', 'and'):
+            position += 1
+        else:
+            return (terms[0] if len(terms) == 1 else ('and', tuple(terms))), position
+
+def parse_not(tokens, position):
+    if position < len(tokens) and tokens[position] == ('word', 'not'):
+        term, position = parse_not(tokens, position + 1)
+        return ('not', term), position
+    left, position = parse_operand(tokens, position)
+    if position < len(tokens) and tokens[position][0] == 'operator':
+        operator = OPERATORS[tokens[position][1]]
+        right, position = parse_operand(tokens, position + 1)
+        return ('cmp', operator, left, right), position
+    if left[0] != 'ref':
+        return left, position
+    # A bare reference is true for an answer that is neither blank nor 0, as in REDCap's PHP
+    # evaluation of logic, so a bare checkbox option is true when it is checked
+    if left[2] is not None:
+        return ('cmp', '=', left, ('value', '1')), position
+    return ('and', (('cmp', '<>', left, ('value', '')), ('cmp', '<>', left, ('value', '0')))), position
+
+def parse_operand(tokens, position):
+    if position >= len(tokens):
+        raise ValueError("Branching logic ends too early")
+    kind, text = tokens[position]
+    if kind == 'ref':
+        # [event_name][variable] refers to the variable in another event; the event is ignored
+        match = REFERENCE.match(text[text.rindex('['):])
+        if match is None:
+            raise ValueError(f"Unsupported reference {text!r} in branching logic")
+        return ('ref', match.group(1).strip(), match.group(2)), position + 1
+    if kind == 'string':
+        return ('value', text[1:-1]), position + 1
+    if kind == 'number':
+        return ('value', text), position + 1
+    if text == '(':
+        tree, position = parse_or(tokens, position + 1)
+        if position >= len(tokens) or tokens[position][1] != ')':
+            raise ValueError("Unbalanced parentheses in branching logic")
+        return tree, position + 1
+    raise ValueError(f"Unexpected {text!r} in branching logic")
+
+def references(tree):
+    # Names of the variables a compiled tree reads
+    if tree[0] == 'ref':
+        return {tree[1]}
+    if tree[0] == 'value':
+        return set()
+    if tree[0] == 'cmp':
+        return references(tree[2]) | references(tree[3])
+    if tree[0] == 'not':
+        return references(tree[1])
+    return set().union(*map(references, tree[1]))
+
+def number(text):
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+def compare(operator, left, right):
+    """
+    Compares two answers the way REDCap does: as numbers when both are numeric, as text
+    otherwise, and an ordering test against a blank or text answer is false.
+
+    >>> compare('<', '9', '18'), compare('=', '18', '18.0'), compare('<>', '', '18')
+    (True, True, True)
+    >>> compare('<', '', '18'), compare('>', 'abc', '18'), compare('<', '9', 'abc')
+    (False, False, False)
+    >>> compare('=', 'abc', 'abc'), compare('>=', 'b', 'a')
+    (True, False)
+    """
+    left_number, right_number = number(left), number(right)
+    if left_number is not None and right_number is not None:
+        left, right = left_number, right_number
+    elif operator not in ('=', '<>'):
+        return False
+    if operator == '=':
+        return left == right
+    if operator == '<>':
+        return left != right
+    return {'<': left < right, '>': left > right, '<=': left <= right, '>=': left >= right}[operator]
+
+def evaluate(tree, value_of):
+    """
+    Evaluates a compiled tree with three-valued logic: True, False, or None when it depends on an
+    answer that is not known. value_of(variable_name, checkbox_code) returns the answer as text
+    ('' when blank, '1'/'0' for a checkbox option) or None when it is unknown.
+    """
+    kind = tree[0]
+    if kind == 'ref':
+        return value_of(tree[1], tree[2])
+    if kind == 'value':
+        return tree[1]
+    if kind == 'cmp':
+        left, right = evaluate(tree[2], value_of), evaluate(tree[3], value_of)
+        return None if left is None or right is None else compare(tree[1], left, right)
+    if kind == 'not':
+        result = evaluate(tree[1], value_of)
+        return None if result is None else not result
+    results = [evaluate(term, value_of) for term in tree[1]]
+    decisive = kind == 'or'  # True decides an or, False decides an and
+    if decisive in results:
+        return decisive
+    return None if None in results else not decisive
+
+def describe(tree, labels):
+    # Readable form of a compiled tree for printing on the CRF; labels maps (variable, code) to
+    # the choice label
+    kind = tree[0]
+    if kind in ('and', 'or'):
+        parts = [describe(term, labels) for term in tree[1]]
+        parts = [f"({part})" if term[0] in ('and', 'or') else part for term, part in zip(tree[1], parts)]
+        return f" {kind} ".join(parts)
+    if kind == 'not':
+        return f"not ({describe(tree[1], labels)})"
+    if kind == 'value':
+        return repr(tree[1]) if tree[1] == '' else tree[1]
+    if kind == 'ref':
+        return tree[1] if tree[2] is None else f"{tree[1]}({tree[2]})"
+    operator, left, right = tree[1:]
+    if left[0] == 'ref' and right[0] == 'value':
+        if left[2] is not None and right[1] in ('0', '1') and operator in ('=', '<>'):
+            label = labels.get((left[1], left[2]), left[2])
+            checked = (right[1] == '1') == (operator == '=')
+            return f"{left[1]}: {label} {'checked' if checked else 'not checked'}"
+        if operator in ('=', '<>') and (left[1], right[1]) in labels:
+            return f"{left[1]} {'is' if operator == '=' else 'is not'} {labels[left[1], right[1]]}"
+    return f"{describe(left, labels)} {operator} {describe(right, labels)}"
+
+def compile_dictionary(forms):
+    """
+    Compiles the branching logic of a whole dictionary, given as (form_name, list of Field)
+    pairs, into its dependency graph. Compiling is cached on the dictionary's logic and choices,
+    so the same dictionary is only compiled once per process.
+    """
+    return compile_fields(tuple((field.variable_name, field.branching_logic, field.choices)
+                                for _, fields in forms for field in fields))
+
+@lru_cache(maxsize=32)
+def compile_fields(items):
+    """
+    Returns the dependency graph as a dict of
+      logic: variable_name -> compiled tree (fields without logic are left out)
+      errors: variable_name -> why its logic could not be compiled (the field is always shown)
+      depends_on / dependents: variable_name -> set of variable names, in both directions
+      order: every variable with logic after the variables it depends on
+      labels: (variable_name, choice value) -> choice label
+    """
+    graph = {'logic': {}, 'errors': {}, 'depends_on': {}, 'dependents': {}, 'labels': {}}
+    for variable_name, branching_logic, choices in items:
+        for value, label in choices:
+            graph['labels'][variable_name, value] = label
+        if not branching_logic:
+            continue
+        try:
+            tree = parse_logic(branching_logic.strip())
+        except ValueError as e:
+            graph['errors'][variable_name] = str(e)
+            continue
+        graph['logic'][variable_name] = tree
+        graph['depends_on'][variable_name] = references(tree)
+        for dependency in graph['depends_on'][variable_name]:
+            graph['dependents'].setdefault(dependency, set()).add(variable_name)
+
+    # Depth-first topological order; a cycle (which REDCap does not allow) is broken where found
+    graph['order'] = []
+    visited = set()
+
+    def visit(variable_name):
+        if variable_name in visited:
+            return
+        visited.add(variable_name)
+        for dependency in sorted(graph['depends_on'].get(variable_name, ())):
+            visit(dependency)
+        if variable_name in graph['logic']:
+            graph['order'].append(variable_name)
+
+    for variable_name, _, _ in items:
+        visit(variable_name)
+    return graph
+
+def hidden_fields(graph, answers):
+    """
+    Returns the variables whose fields cannot be shown for the given answers, a dict of
+    variable_name -> value (a list of checked codes for checkbox fields). Unanswered variables
+    are unknown, so only logic that is false whatever they hold hides a field; a hidden field
+    counts as blank in the logic of the fields that depend on it.
+    """
+    hidden = set()
+
+    def value_of(variable_name, code):
+        if variable_name in hidden:
+            return '' if code is None else '0'
+        if code is not None and f"{variable_name}___{code}" in answers:
+            return str(answers[f"{variable_name}___{code}"])
+        if variable_name not in answers:
+            return None
+        value = answers[variable_name]
+        if code is None:
+            return '' if value is None else str(value)
+        checked = value if isinstance(value, (list, tuple, set)) else str(value).split(',')
+        return '1' if code in {str(c).strip() for c in checked} else '0'
+
+    for variable_name in graph['order']:
+        if evaluate(graph['logic'][variable_name], value_of) is False:
+            hidden.add(variable_name)
+    return hidden
+
+def prune_forms(forms, graph, answers):
+    """
+    Drops the fields that cannot be shown for a site's answers, and any form left empty.
+    Returns (forms, hidden variable names).
+    """
+    hidden = hidden_fields(graph, answers)
+    pruned = []
+    for form_name, fields in forms:
+        kept = [field for field in fields if field.variable_name not in hidden]
+        if kept:
+            pruned.append((form_name, kept))
+    return pruned, hidden
+
+def annotate_forms(forms, graph):
+    # Sets each dependent field's condition, which layout prints under its question
+    annotated = []
+    for form_name, fields in forms:
+        annotated.append((form_name, [annotate_field(field, graph) for field in fields]))
+    return annotated
+
+def annotate_field(field, graph):
+    if field.variable_name in graph['logic']:
+        condition = describe(graph['logic'][field.variable_name], graph['labels'])
+    elif field.variable_name in graph['errors']:
+        condition = field.branching_logic.strip()
+    else:
+        return field
+    return field._replace(condition=f"Only if {condition}")
@@ -0,0 +1,150 @@
+import zlib
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def check_pypdf2():
+    """
+    PyPDF2 has no public API for a document's catalog, for objects outside its page tree or for
+    setting a stream's encoded bytes. The helpers that need them (catalog, set_encoded_data and
+    stamp.TemplateObjects) use the internals of PyPDF2 3.x, its last release series, and call
+    this first: it raises ImportError for any other version.
+    """
+    import PyPDF2
+
+    if PyPDF2.__version__.split('.')[0] != '3':
+        raise ImportError(f"PyPDF2 3.x is needed, found {PyPDF2.__version__}")
+
+def catalog(writer):
+    # The document catalog of a PdfWriter (PdfWriter._root_object)
+    check_pypdf2()
+    return writer._root_object
+
+def set_encoded_data(stream, data):
+    # Replaces a stream's encoded bytes (StreamObject._data); the caller sets the /Filter that
+    # decodes them
+    check_pypdf2()
+    stream._data = data
+
+def merge_pdfs(pdf_files, output_pdf, form_fields=False):
+    # PyPDF2 is only needed here, so it is imported on the first merge rather than at startup
+    if form_fields:
+        merge_fillable_pdfs(pdf_files, output_pdf)
+        return
+    from PyPDF2 import PdfMerger
+
+    merger = PdfMerger()
+    for pdf in pdf_files:
+        merger.append(pdf)
+    merger.write(output_pdf)
+    merger.close()
+
+def merge_fillable_pdfs(pdf_files, output_pdf):
+    # PdfMerger keeps the fields' widgets but drops the AcroForm that makes them fillable
+    from PyPDF2 import PdfReader, PdfWriter
+
+    writer = PdfWriter()
+    readers = [PdfReader(pdf) for pdf in pdf_files]
+    for reader in readers:
+        for page in reader.pages:
+            writer.add_page(page)
+    add_acro_form(writer, readers)
+    writer.write(output_pdf)
+
+def add_acro_form(writer, readers):
+    """
+    Copies the fields of every reader's AcroForm into a single AcroForm of the writer, whose pages
+    were added from those readers, with the default resources (the fonts text fields are typed in)
+    of the first reader that has any.
+    """
+    from PyPDF2.generic import ArrayObject, BooleanObject, DictionaryObject, NameObject
+
+    fields = ArrayObject()
+    resources = None
+    for reader in readers:
+        source = reader.trailer['/Root'].get('/AcroForm')
+        if source is None:
+            continue
+        source = source.get_object()
+        for field in source.get('/Fields', []):
+            # The copies of the widgets already on the writer's pages are reused. Adding a page
+            # drops every /Parent in it, so a radio group's widgets are linked to it again.
+            field = field.clone(writer)
+            for kid in field.get_object().get('/Kids', []):
+                kid.get_object()[NameObject('/Parent')] = field
+            fields.append(field)
+        if resources is None and '/DR' in source:
+            resources = source['/DR'].clone(writer)
+    if not fields:
+        return
+    # Built here: set_need_appearances_writer() points a new /AcroForm at the last object written
+    acro_form = DictionaryObject({NameObject('/Fields'): fields,
+                                  NameObject('/NeedAppearances'): BooleanObject(True)})
+    if resources is not None:
+        acro_form[NameObject('/DR')] = resources
+    catalog(writer)[NameObject('/AcroForm')] = acro_form
+
+def resource_key(obj):
+    # Content of a PDF object with its references followed, so copies from different files match
+    from PyPDF2.generic import ArrayObject, DictionaryObject, StreamObject
+
+    obj = obj.get_object()
+    if isinstance(obj, StreamObject):
+        entries = tuple(sorted((k, resource_key(v)) for k, v in obj.items() if k not in ('/Length', '/Filter')))
+        return entries, obj.get_data()
+    if isinstance(obj, DictionaryObject):
+        return tuple(sorted((k, resource_key(v)) for k, v in obj.items()))
+    if isinstance(obj, ArrayObject):
+        return tuple(resource_key(v) for v in obj)
+    return type(obj).__name__, str(obj)
+
+def binary_flate(stream):
+    # reportlab wraps Flate data in ASCII85, which adds a quarter; PDF files can hold it as binary
+    from PyPDF2.generic import ArrayObject, NameObject
+
+    filters = stream.get('/Filter')
+    if filters is None or isinstance(filters, ArrayObject) and list(filters) == ['/ASCII85Decode', '/FlateDecode']:
+        set_encoded_data(stream, zlib.compress(stream.get_data()))
+        stream[NameObject('/Filter')] = NameObject('/FlateDecode')
+
+def share_resources(page, shared):
+    # Points the page's fonts and XObjects at the first identical copy seen in the document
+    from PyPDF2.generic import IndirectObject, NameObject
+
+    resources = page.get('/Resources')
+    if resources is None:
+        return
+    resources = resources.get_object()
+    for category in ('/Font', '/XObject'):
+        if category not in resources:
+            continue
+        entries = resources[category].get_object()
+        for name, reference in list(entries.items()):
+            if not isinstance(reference, IndirectObject):
+                continue
+            key = (category, resource_key(reference))
+            if key not in shared:
+                shared[key] = reference
+                if category == '/XObject':
+                    binary_flate(reference.get_object())
+            entries[NameObject(name)] = shared[key]
+
+def optimize_pdf(input_pdf, output_pdf):
+    """
+    Rewrites a PDF for distribution: fonts and XObjects with identical content are written once and
+    shared by every page that uses them, and content streams are stored as binary Flate data.
+    input_pdf and output_pdf may be paths or file objects.
+    """
+    from PyPDF2 import PdfReader, PdfWriter
+    from PyPDF2.generic import ArrayObject
+
+    reader = PdfReader(input_pdf)
+    writer = PdfWriter()
+    shared = {}
+    for page in reader.pages:
+        share_resources(page, shared)
+        contents = page['/Contents'].get_object()
+        for stream in (contents if isinstance(contents, ArrayObject) else [contents]):
+            binary_flate(stream.get_object())
+        writer.add_page(page)
+    add_acro_form(writer, [reader])
+    writer.write(output_pdf)
@@ -0,0 +1,174 @@
+import cProfile
+import io
+import json
+import os
+import shutil
+import time
+
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from .api import version_number as default_version_number
+from .backends import BACKENDS, export_form
+from .cache import form_cache_key, store_in_cache
+from .fields import read_forms_csv, stream_forms_csv
+from .layout import layout_form
+from .logic import annotate_forms, compile_dictionary, prune_forms
+from .merge import merge_pdfs, optimize_pdf
+from .render import draw_form, render_forms
+
+ENGINES = ("csv", "pandas")
+
+def create_pdfs_from_csv(csv_file, workers=1, single_pass=False, form_files=True, cache_dir=None,
+                         stream=False, report_file=None, profile_file=None, output_dir=".",
+                         version_number=default_version_number, engine="csv", page_range_size=0,
+                         optimize=False, fillable=False, site_profile=None, annotate_logic=False, exports=()):
+    """
+    Renders every form in csv_file and assembles the combined PDF. Returns the run report: wall
+    time, pages, fields and bytes per form, plus totals. report_file also writes it as JSON, and
+    profile_file dumps cProfile stats for the run (worker processes are not profiled).
+    page_range_size > 0 paints forms longer than that many pages in parallel page ranges, and
+    optimize shrinks the combined PDF for distribution (see optimize_pdf) and reports both sizes.
+    fillable adds AcroForm fields named by variable_name to every PDF. site_profile (a dict of
+    answers, or a JSON file of one) drops the fields its answers hide, and annotate_logic prints
+    each dependent field's branching logic under it. exports names further formats from
+    backends.BACKENDS ('html', 'docx') written next to each form's PDF from the same layout.
+    """
+    profiler = cProfile.Profile() if profile_file else None
+    if profiler:
+        profiler.enable()
+    try:
+        report = run_pipeline(csv_file, workers, single_pass, form_files, cache_dir, stream,
+                              output_dir, version_number, engine, page_range_size, optimize, fillable,
+                              site_profile, annotate_logic, exports)
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(profile_file)
+            print(f"Profile saved to {profile_file}")
+
+    if report_file:
+        with open(report_file, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Run report saved to {report_file}")
+    return report
+
+def open_forms(dictionary, stream, engine):
+    """
+    Returns an iterator of (form_name, list of Field). CSV paths are read with the csv module so
+    pandas is never imported; the pandas engine, and DataFrame input, go through frames.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}', expected one of {', '.join(ENGINES)}")
+    is_path = isinstance(dictionary, (str, os.PathLike))
+    if stream and not is_path:
+        raise ValueError("stream needs a CSV path to read from")
+    if engine == "csv" and is_path:
+        return stream_forms_csv(dictionary) if stream else read_forms_csv(dictionary)
+
+    from . import frames
+    return frames.stream_forms(dictionary) if stream else frames.read_forms(os.fspath(dictionary) if is_path else dictionary)
+
+def apply_branching_logic(forms, site_profile, annotate_logic, report):
+    # Logic may refer to fields on any form, so the whole dictionary is read before it is applied
+    forms = list(forms)
+    graph = compile_dictionary(forms)
+    report['logic_fields'] = len(graph['logic'])
+    report['logic_errors'] = graph['errors']
+    if site_profile:
+        if not isinstance(site_profile, dict):
+            with open(site_profile) as f:
+                site_profile = json.load(f)
+        forms, hidden = prune_forms(forms, graph, site_profile)
+        report['pruned_fields'] = sorted(hidden)
+    if annotate_logic:
+        forms = annotate_forms(forms, graph)
+    return forms
+
+def run_pipeline(csv_file, workers, single_pass, form_files, cache_dir, stream, output_dir, version_number, engine,
+                 page_range_size, optimize, fillable, site_profile, annotate_logic, exports):
+    if not (single_pass or form_files):
+        raise ValueError("form_files can only be turned off together with single_pass")
+    if single_pass and cache_dir:
+        raise ValueError("cache_dir assembles the combined PDF from cached forms and cannot be used with single_pass")
+    if page_range_size and workers <= 1:
+        raise ValueError("page_range_size splits forms across worker processes and needs workers > 1")
+    exports = tuple(exports or ())
+    unknown = [name for name in exports if name not in BACKENDS]
+    if unknown:
+        raise ValueError(f"Unknown export format {unknown[0]!r}, expected one of {', '.join(BACKENDS)}")
+
+    start = time.perf_counter()
+    # Streaming keeps the file's form order; grouping sorts forms by name
+    forms = open_forms(csv_file, stream, engine)
+    os.makedirs(output_dir, exist_ok=True)
+    combined_pdf = os.path.join(output_dir, f"combined_forms_{version_number}.pdf")
+    # The optimized combined PDF is rewritten from an in-memory copy of the ordinary one
+    assembled_pdf = io.BytesIO() if optimize else combined_pdf
+    # Single pass: every form goes onto one canvas, so no per-form file is re-read and merged
+    combined = canvas.Canvas(assembled_pdf, pagesize=letter) if single_pass else None
+    source = os.fspath(csv_file) if isinstance(csv_file, (str, os.PathLike)) else "<DataFrame>"
+    report = {'csv_file': source, 'version_number': version_number, 'workers': workers,
+              'page_range_size': page_range_size, 'fillable': fillable, 'exports': list(exports),
+              'forms': [], 'single_pass_forms': []}
+    pdf_files = []
+    cache_paths = {}
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    if site_profile or annotate_logic:
+        forms = apply_branching_logic(forms, site_profile, annotate_logic, report)
+
+    def form_jobs():
+        for form_name, form_fields in forms:
+            output_pdf = os.path.join(output_dir, f"{form_name}_{version_number}.pdf")
+            pdf_files.append(output_pdf)
+            # Laid out once here when the parent needs the pages anyway; workers then only paint
+            pages = layout_form(form_fields, form_name) if combined is not None else None
+            if combined is not None:
+                report['single_pass_forms'].append(draw_form(combined, form_fields, form_name, pages, fillable))
+                combined.showPage()
+            if not form_files:
+                if exports:
+                    report['single_pass_forms'][-1]['exports'] = export_form(form_fields, form_name, pages,
+                                                                            output_pdf, exports)
+                continue
+            if cache_dir:
+                cache_key = form_cache_key(form_name, form_fields, version_number, fillable)
+                cache_paths[form_name] = os.path.join(cache_dir, f"{cache_key}.pdf")
+                if os.path.exists(cache_paths[form_name]):
+                    shutil.copyfile(cache_paths[form_name], output_pdf)
+                    report['forms'].append({'form': form_name, 'fields': len(form_fields), 'cached': True,
+                                            'output_pdf': output_pdf, 'bytes': os.path.getsize(output_pdf)})
+                    if exports:
+                        pages = pages or layout_form(form_fields, form_name)
+                        report['forms'][-1]['exports'] = export_form(form_fields, form_name, pages, output_pdf,
+                                                                     exports)
+                    print(f"PDF for form '{form_name}' reused from cache for {output_pdf}")
+                    continue
+            yield (form_fields, form_name, output_pdf) + ((pages,) if pages is not None else ())
+
+    for stats in render_forms(form_jobs(), workers, page_range_size, fillable, exports):
+        if cache_dir:
+            store_in_cache(stats['output_pdf'], cache_paths[stats['form']])
+        stats['cached'] = False
+        report['forms'].append(stats)
+        print(f"PDF for form '{stats['form']}' saved to {stats['output_pdf']}")
+
+    assemble_start = time.perf_counter()
+    if combined is not None:
+        combined.save()
+    else:
+        merge_pdfs(pdf_files, assembled_pdf, form_fields=fillable)
+    if optimize:
+        optimize_pdf(assembled_pdf, combined_pdf)
+        report['optimized'] = {'before_bytes': len(assembled_pdf.getvalue()),
+                               'after_bytes': os.path.getsize(combined_pdf)}
+    report['assemble_seconds'] = time.perf_counter() - assemble_start
+    report['combined_pdf'] = combined_pdf
+    report['combined_bytes'] = os.path.getsize(combined_pdf)
+    report['total_seconds'] = time.perf_counter() - start
+    print(f"Combined PDF saved to {combined_pdf}")
+    if optimize:
+        before, after = report['optimized']['before_bytes'], report['optimized']['after_bytes']
+        print(f"Optimized from {before} to {after} bytes ({100 * (before - after) / before:.0f}% smaller)")
+    return report
@@ -0,0 +1,161 @@
+import argparse
+import io
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from .fillable import checkbox_column
+from .layout import layout_form
+from .pipeline import open_forms
+from .render import create_pdf_for_form
+from .stamp import PacketWriter, batches, build_template, file_name, pdf_string, read_csv_rows
+from .text import word_width_units, wrap_lines
+
+CHECKED = {'1', 'checked', 'yes', 'true'}
+KAPPA = 0.5523  # Bezier control distance of a quarter circle, times the radius
+# A notes widget is five 18 pt boxes 22 pt apart; its input op covers them from the bottom one up
+NOTES_LINES = 5
+NOTES_LINE_STEP = 22
+# A worker process's prepare_forms() result, handed over once when the process starts
+WORKER_FORMS = None
+
+def prepare_forms(forms):
+    """
+    Lays out and paints every form once. Returns (template, page_inputs, choice_codes): the
+    packet template of the blank forms (see stamp.build_template), the input ops of each of its
+    pages and, per radio or checkbox variable, its choice codes by label, so label exports work.
+    """
+    pdfs = []
+    page_inputs = []
+    choice_codes = {}
+    for form_name, fields in forms:
+        pages = layout_form(fields, form_name)
+        buffer = io.BytesIO()
+        create_pdf_for_form(fields, form_name, buffer, pages)
+        buffer.seek(0)
+        pdfs.append(buffer)
+        page_inputs.extend([op[1:] for op in ops if op[0] == 'input'] for ops in pages)
+        for field in fields:
+            if field.choices:
+                choice_codes[field.variable_name] = {label: value for value, label in field.choices}
+    return build_template(pdfs), page_inputs, choice_codes
+
+def dot(x, y, r):
+    k = KAPPA * r
+    return (b'%g %g m %g %g %g %g %g %g c %g %g %g %g %g %g c %g %g %g %g %g %g c %g %g %g %g %g %g c f\n'
+            % (x + r, y, x + r, y + k, x + k, y + r, x, y + r, x - k, y + r, x - r, y + k, x - r, y,
+               x - r, y - k, x - k, y - r, x, y - r, x + k, y - r, x + r, y - k, x + r, y))
+
+def cross(x, y, size):
+    return (b'q 1.2 w %g %g m %g %g l %g %g m %g %g l S Q\n'
+            % (x + 2, y + 2, x + size - 2, y + size - 2, x + 2, y + size - 2, x + size - 2, y + 2))
+
+def text_line(x, y, size, text):
+    return b'BT /FStamp %g Tf %g %g Td %s Tj ET\n' % (size, x, y, pdf_string(text))
+
+def answer_ops(inputs, record, choice_codes):
+    """
+    Content stream that writes one record's answers over a page: the text in its text and notes
+    boxes, a dot in each chosen radio button and a cross in each checked checkbox.
+    """
+    ops = []
+    for x, y, width, height, kind, name, value in inputs:
+        if kind == 'radio':
+            answer = (record.get(name) or '').strip()
+            if answer and value in (answer, choice_codes.get(name, {}).get(answer)):
+                ops.append(dot(x + width / 2, y + height / 2, 2.5))
+        elif kind == 'checkbox':
+            if (record.get(checkbox_column(name, value)) or '').strip().lower() in CHECKED:
+                ops.append(cross(x, y, width))
+        elif record.get(name):
+            words = record[name].split()
+            answer = ' '.join(words)
+            if kind == 'text':
+                # Long answers are set smaller rather than cut off. Words repeat across records, so
+                # they are measured through the shared word cache.
+                units = (sum(word_width_units(word, "Helvetica") for word in words)
+                         + word_width_units(' ', "Helvetica") * (len(words) - 1))
+                size = min(10, 1000 * (width - 8) / max(units, 1))
+                ops.append(text_line(x + 4, y + 5, size, answer))
+            else:
+                lines = wrap_lines(answer, "Helvetica", 10, width - 8)
+                if len(lines) > NOTES_LINES:
+                    lines = lines[:NOTES_LINES - 1] + (lines[NOTES_LINES - 1] + " ...",)
+                first_box = y + height - 18
+                ops.extend(text_line(x + 4, first_box - NOTES_LINE_STEP * i + 5, 10, line)
+                           for i, line in enumerate(lines))
+    return b''.join(ops)
+
+def record_name(record, id_field):
+    # Longitudinal and repeating exports have a row per event and instance of a record
+    parts = [record.get(column) for column in
+             (id_field, 'redcap_event_name', 'redcap_repeat_instrument', 'redcap_repeat_instance')]
+    return file_name('_'.join(part for part in parts if part))
+
+def use_prepared(prepared):
+    # Pool initializer: the template pages are sent to each worker once, not with every batch
+    global WORKER_FORMS
+    WORKER_FORMS = prepared
+
+def fill_records(records, output_dir, id_field, prepared=None):
+    # Runs in a worker process for a batch of records
+    template, page_inputs, choice_codes = prepared or WORKER_FORMS
+    for record in records:
+        writer = PacketWriter(os.path.join(output_dir, f"{record_name(record, id_field)}.pdf"), template)
+        writer.add_packet([answer_ops(inputs, record, choice_codes) for inputs in page_inputs])
+        writer.close()
+    return len(records)
+
+def render_records(dictionary, records, output_dir=".", forms=None, id_field='record_id', workers=1,
+                   batch_size=128):
+    """
+    Renders a completed CRF per row of a REDCap record export (raw or label values): every form
+    of the dictionary, or only those named in forms, with its answers filled in. Each form is laid
+    out and painted once for the whole export; records stream through the worker pool in batches
+    and only add their answers to the shared pages. Returns a summary for the run report.
+    """
+    start = time.perf_counter()
+    selected = [(form_name, fields) for form_name, fields in open_forms(dictionary, False, "csv")
+                if forms is None or form_name in forms]
+    if not selected:
+        raise ValueError("None of the requested forms are in the data dictionary")
+    prepared = prepare_forms(selected)
+    prepare_seconds = time.perf_counter() - start
+    os.makedirs(output_dir, exist_ok=True)
+    fill = partial(fill_records, output_dir=output_dir, id_field=id_field)
+    if workers > 1:
+        count = 0
+        with ProcessPoolExecutor(max_workers=workers, initializer=use_prepared, initargs=(prepared,)) as executor:
+            pending = deque()
+            for batch in batches(read_csv_rows(records), batch_size):
+                pending.append(executor.submit(fill, batch))
+                # Don't read further ahead than the pool can fill
+                if len(pending) >= 2 * workers:
+                    count += pending.popleft().result()
+            count += sum(future.result() for future in pending)
+    else:
+        count = sum(map(partial(fill, prepared=prepared), batches(read_csv_rows(records), batch_size)))
+    return {'records': count, 'forms': [form_name for form_name, _ in selected],
+            'pages_per_record': len(prepared[1]), 'output_dir': output_dir,
+            'prepare_seconds': prepare_seconds, 'seconds': time.perf_counter() - start}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="crf_generator.prefill",
+                                     description="Render completed CRFs from a REDCap record export.")
+    parser.add_argument("dictionary_csv", help="Data dictionary of the project")
+    parser.add_argument("records_csv", help="Record export, one row per record (and event)")
+    parser.add_argument("--output-dir", default=".", help="One PDF per record is written here")
+    parser.add_argument("--forms", help="Comma-separated form names to render (default: all)")
+    parser.add_argument("--id-field", default="record_id", help="Record ID column of the export")
+    parser.add_argument("--workers", type=int, default=1, help="Processes filling records")
+    args = parser.parse_args(argv)
+    forms = [form.strip() for form in args.forms.split(',')] if args.forms else None
+    summary = render_records(args.dictionary_csv, args.records_csv, args.output_dir, forms, args.id_field,
+                             args.workers)
+    print(f"{summary['records']} records of {summary['pages_per_record']} pages saved to "
+          f"{summary['output_dir']} in {summary['seconds']:.1f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import io
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import partial
+from operator import itemgetter
+
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from .backends import export_form
+from .layout import layout_form, paint_form
+from .merge import merge_pdfs
+
+def create_pdf_for_form(fields, form_name, output_pdf, pages=None, fillable=False):
+    """
+    Renders one form to output_pdf (a path or file object) and returns its stats from draw_form,
+    plus the time spent in c.save() and the bytes written.
+    """
+    c = canvas.Canvas(output_pdf, pagesize=letter)
+    stats = draw_form(c, fields, form_name, pages, fillable)
+    start = time.perf_counter()
+    c.save()
+    stats['save_seconds'] = time.perf_counter() - start
+    stats['seconds'] += stats['save_seconds']
+    stats['output_pdf'] = output_pdf if isinstance(output_pdf, str) else None
+    stats['bytes'] = os.path.getsize(output_pdf) if isinstance(output_pdf, str) else len(output_pdf.getvalue())
+    return stats
+
+def draw_form(c, fields, form_name, pages=None, fillable=False):
+    """
+    Draws one form onto an open canvas; the caller decides when to save. fields is the form's
+    list of Field records, and pages an already computed layout_form() result, if there is one.
+    fillable adds AcroForm fields over the printed boxes. Returns stats for the run report.
+    """
+    start = time.perf_counter()
+    if pages is None:
+        pages = layout_form(fields, form_name)
+    layout_done = time.perf_counter()
+    paint_form(c, pages, form_name, fillable=fillable)
+    paint_done = time.perf_counter()
+    return {
+        'form': form_name,
+        'fields': len(fields),
+        'matrix_groups': len({field.matrix_name for field in fields if field.matrix_name is not None}),
+        'pages': len(pages),
+        'layout_seconds': layout_done - start,
+        'paint_seconds': paint_done - layout_done,
+        'seconds': paint_done - start,
+    }
+
+def render_form_job(job, fillable=False, exports=()):
+    # Runs in a worker process, so it only takes and returns picklable values.
+    # job is (fields, form_name, output_pdf), plus the form's pages when it was laid out already.
+    # The PDF and every export format are written from one layout.
+    if not exports:
+        return create_pdf_for_form(*job, fillable=fillable)
+    fields, form_name, output_pdf, *laid_out = job
+    start = time.perf_counter()
+    pages = laid_out[0] if laid_out else layout_form(fields, form_name)
+    layout_seconds = time.perf_counter() - start
+    stats = create_pdf_for_form(fields, form_name, output_pdf, pages, fillable)
+    stats['layout_seconds'] += layout_seconds
+    stats['seconds'] += layout_seconds
+    stats['exports'] = export_form(fields, form_name, pages, output_pdf, exports)
+    return stats
+
+def paint_page_range(job):
+    # Runs in a worker process: paints some consecutive pages of a laid-out form to PDF bytes
+    pages, form_name, first_page, page_count, fillable = job
+    start = time.perf_counter()
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
+    paint_form(c, pages, form_name, first_page, page_count, fillable)
+    c.save()
+    return buffer.getvalue(), time.perf_counter() - start
+
+def join_page_ranges(stats, output_pdf, fillable, ranges):
+    # Concatenates the painted ranges in page order and completes the form's stats
+    start = time.perf_counter()
+    merge_pdfs([io.BytesIO(pdf) for pdf, _ in ranges], output_pdf, form_fields=fillable)
+    stats['paint_seconds'] = sum(seconds for _, seconds in ranges)
+    stats['save_seconds'] = time.perf_counter() - start
+    stats['seconds'] = stats['layout_seconds'] + stats['paint_seconds'] + stats['save_seconds']
+    stats['output_pdf'] = output_pdf
+    stats['bytes'] = os.path.getsize(output_pdf)
+    return stats
+
+def page_range_stats(fields, form_name, pages, range_pages, layout_seconds):
+    # Stats of a form painted as page ranges, until join_page_ranges completes them
+    return {
+        'form': form_name,
+        'fields': len(fields),
+        'matrix_groups': len({field.matrix_name for field in fields if field.matrix_name is not None}),
+        'pages': len(pages),
+        'page_ranges': -(-len(pages) // range_pages),
+        'layout_seconds': layout_seconds,
+    }
+
+def lay_out_form_job(job, range_pages, fillable=False, exports=()):
+    # Runs in a worker process: lays out a form and renders it there, unless it is longer than
+    # range_pages. Returns (stats, None) for a rendered form, or (stats so far, pages) for a form
+    # to paint as page ranges.
+    fields, form_name, output_pdf = job
+    start = time.perf_counter()
+    pages = layout_form(fields, form_name)
+    layout_seconds = time.perf_counter() - start
+    if len(pages) > range_pages:
+        return page_range_stats(fields, form_name, pages, range_pages, layout_seconds), pages
+    stats = render_form_job((fields, form_name, output_pdf, pages), fillable, exports)
+    stats['layout_seconds'] += layout_seconds
+    stats['seconds'] += layout_seconds
+    return stats, None
+
+def submit_page_ranges(executor, job, pages, stats, range_pages, fillable, exports):
+    # Spreads a laid-out form's page ranges, and its exports, over the pool
+    fields, form_name, output_pdf = job[:3]
+    futures = [executor.submit(paint_page_range, (pages[i:i + range_pages], form_name, i + 1, len(pages), fillable))
+               for i in range(0, len(pages), range_pages)]
+    if not exports:
+        return futures, partial(join_page_ranges, stats, output_pdf, fillable)
+    # The exports are one more task in the pool, finished last
+    futures.append(executor.submit(export_form, fields, form_name, pages, output_pdf, exports))
+
+    def finish(results):
+        join_page_ranges(stats, output_pdf, fillable, results[:-1])
+        stats['exports'] = results[-1]
+        return stats
+
+    return futures, finish
+
+def submit_form(executor, job, range_pages, fillable, exports):
+    """
+    Submits one form job and returns (futures, finish), where finish turns the futures' results
+    into the form's stats. With range_pages a form longer than range_pages is painted as ranges
+    of that many pages, spread over the pool. Unless the job carries its pages, the form is laid
+    out in a worker first, and a long one comes back as its pages: finish then submits its page
+    ranges and returns their (futures, finish) instead of stats.
+    """
+    if not range_pages:
+        return [executor.submit(render_form_job, job, fillable, exports)], itemgetter(0)
+    fields, form_name, output_pdf, *laid_out = job
+    if not laid_out:
+        def laid_out_in_worker(results):
+            stats, pages = results[0]
+            if pages is None:
+                return stats
+            return submit_page_ranges(executor, job, pages, stats, range_pages, fillable, exports)
+
+        return [executor.submit(lay_out_form_job, job, range_pages, fillable, exports)], laid_out_in_worker
+    pages = laid_out[0]
+    if len(pages) <= range_pages:
+        return [executor.submit(render_form_job, job, fillable, exports)], itemgetter(0)
+    stats = page_range_stats(fields, form_name, pages, range_pages, 0.0)
+    return submit_page_ranges(executor, job, pages, stats, range_pages, fillable, exports)
+
+def render_forms(jobs, workers, range_pages=0, fillable=False, exports=()):
+    """
+    Renders jobs as they arrive and yields each form's stats in job order. range_pages > 0 splits
+    forms longer than that many pages into page ranges painted in parallel (see submit_form), and
+    exports names the formats from backends.BACKENDS written next to each PDF.
+    """
+    if workers <= 1:
+        yield from map(partial(render_form_job, fillable=fillable, exports=exports), jobs)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # [futures, finish] of each form in job order; [stats, None] once the form is finished
+        pending = deque()
+
+        def advance():
+            # Takes every form whose futures are done a step further, so a form laid out in a
+            # worker gets its page ranges submitted as soon as its pages come back
+            for entry in pending:
+                futures, finish = entry
+                if finish is not None and all(future.done() for future in futures):
+                    result = finish([future.result() for future in futures])
+                    entry[:] = result if isinstance(result, tuple) else (result, None)
+
+        def finish_next():
+            advance()
+            while pending[0][1] is not None:
+                wait([future for futures, finish in pending if finish is not None
+                      for future in futures if not future.done()], return_when=FIRST_COMPLETED)
+                advance()
+            return pending.popleft()[0]
+
+        for job in jobs:
+            pending.append(list(submit_form(executor, job, range_pages, fillable, exports)))
+            # Don't read further ahead than the pool can render
+            while (sum(len(futures) if finish else 1 for futures, finish in pending) >= 2 * workers
+                   and len(pending) > 1):
+                yield finish_next()
+        while pending:
+            yield finish_next()
@@ -0,0 +1,206 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import socketserver
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from .fields import read_forms_csv
+from .render import create_pdf_for_form, draw_form
+from .text import word_width_units, wrap_texts
+
+def warm_up():
+    # Loads the font metrics and glyph-width tables once per process so the first request
+    # doesn't pay for them
+    for font_name in ("Helvetica", "Helvetica-Bold"):
+        word_width_units(' ', font_name)
+    wrap_texts(["warm up"], "Helvetica", 12, letter[0])
+
+class UnknownFormError(KeyError):
+    # Raised for a form the data dictionary doesn't have; the handler answers it with 404
+    pass
+
+def render_form_bytes(form_fields, form_name):
+    buffer = io.BytesIO()
+    create_pdf_for_form(form_fields, form_name, buffer)
+    return buffer.getvalue()
+
+def render_combined_bytes(forms):
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
+    for form_name, form_fields in forms:
+        draw_form(c, form_fields, form_name)
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+class RenderService:
+    """
+    Keeps everything a render needs warm between requests: parsed dictionaries (keyed by a hash
+    of the CSV bytes), and worker processes whose font metrics, glyph-width tables and wrapped
+    labels (text.LAYOUT_LINES) live as long as the service, so a dictionary rendered again only
+    wraps its new labels. At most workers + queue_size requests are admitted; the rest are turned
+    away.
+    """
+
+    def __init__(self, workers=2, queue_size=8, dictionary_cache_size=16):
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=warm_up) if workers > 0 else None
+        self.slots = threading.BoundedSemaphore(max(workers, 1) + queue_size)
+        self.dictionaries = OrderedDict()
+        self.dictionary_cache_size = dictionary_cache_size
+        self.lock = threading.Lock()
+        self.requests = 0
+        warm_up()
+
+    def parse(self, csv_bytes):
+        key = hashlib.sha256(csv_bytes).hexdigest()
+        with self.lock:
+            if key in self.dictionaries:
+                self.dictionaries.move_to_end(key)
+                return self.dictionaries[key]
+        text = io.StringIO(csv_bytes.decode('utf-8-sig'), newline='')
+        forms = OrderedDict(read_forms_csv(text))
+        with self.lock:
+            self.dictionaries[key] = forms
+            while len(self.dictionaries) > self.dictionary_cache_size:
+                self.dictionaries.popitem(last=False)
+        return forms
+
+    def admit(self):
+        # Returns False when the queue is full, so the caller can answer 503 straight away.
+        # Every admitted request must call release() when it is done.
+        return self.slots.acquire(blocking=False)
+
+    def release(self):
+        self.slots.release()
+
+    def run(self, function, *args):
+        with self.lock:
+            self.requests += 1
+        if self.executor is None:
+            return function(*args)
+        return self.executor.submit(function, *args).result()
+
+    def render_form(self, csv_bytes, form_name):
+        forms = self.parse(csv_bytes)
+        if form_name not in forms:
+            raise UnknownFormError(form_name)
+        return self.run(render_form_bytes, forms[form_name], form_name)
+
+    def render_combined(self, csv_bytes):
+        return self.run(render_combined_bytes, list(self.parse(csv_bytes).items()))
+
+    def status(self):
+        with self.lock:
+            return {'workers': self.workers, 'requests': self.requests,
+                    'cached_dictionaries': len(self.dictionaries)}
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /combined           body: data dictionary CSV -> combined PDF
+    POST /forms/<form_name>  body: data dictionary CSV -> that form's PDF
+    GET  /status             cache and queue information as JSON
+    """
+
+    service = None  # Set by make_server
+
+    def do_GET(self):
+        if self.path == '/status':
+            self.send_body(200, 'application/json', json.dumps(self.service.status()).encode('utf-8'))
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        if self.path != '/combined' and not self.path.startswith('/forms/'):
+            self.send_error(404)
+            return
+        csv_bytes = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not self.service.admit():
+            self.send_error(503, "Render queue is full")
+            return
+        try:
+            if self.path == '/combined':
+                pdf = self.service.render_combined(csv_bytes)
+            else:
+                pdf = self.service.render_form(csv_bytes, unquote(self.path[len('/forms/'):]))
+        except UnknownFormError as e:
+            self.send_error(404, f"No form named {e.args[0]!r} in the data dictionary")
+            return
+        except (UnicodeDecodeError, ValueError) as e:
+            self.send_error(400, str(e))
+            return
+        except Exception:
+            traceback.print_exc()
+            self.send_error(500, "Render failed")
+            return
+        finally:
+            self.service.release()
+        self.send_body(200, 'application/pdf', pdf)
+
+    def send_body(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else 'unix-socket'
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name, self.server_port = 'localhost', 0
+
+def make_server(service, host='127.0.0.1', port=8765, socket_path=None):
+    handler = type('BoundRenderRequestHandler', (RenderRequestHandler,), {'service': service})
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        return ThreadingUnixHTTPServer(socket_path, handler)
+    return ThreadingHTTPServer((host, port), handler)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="crf_generator.server",
+                                     description="Serve CRF PDFs over HTTP with warm caches.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", dest="socket_path", help="Listen on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=2,
+                        help="Render processes kept alive between requests (0 renders in the request thread)")
+    parser.add_argument("--queue-size", type=int, default=8,
+                        help="Requests that may wait for a free worker before new ones get 503")
+    parser.add_argument("--dictionary-cache-size", type=int, default=16,
+                        help="Parsed data dictionaries kept in memory")
+    args = parser.parse_args(argv)
+
+    service = RenderService(args.workers, args.queue_size, args.dictionary_cache_size)
+    server = make_server(service, args.host, args.port, args.socket_path)
+    print(f"Serving CRF PDFs on {args.socket_path or f'http://{args.host}:{args.port}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+if __name__ == "__main__":
+    main()
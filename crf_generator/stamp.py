@@ -0,0 +1,323 @@
+import argparse
+import csv
+import io
+import os
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from itertools import islice
+
+from reportlab.graphics.barcode.code128 import Code128
+from reportlab.lib.pagesizes import letter
+
+from .merge import check_pypdf2, set_encoded_data
+from .text import wrap_lines
+
+# Packets are written straight to PDF bytes: every blank page becomes a Form XObject written once,
+# and a participant's pages only add a page object each plus one shared overlay stream.
+PDF_HEADER = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+FOOTER_MARGIN = 50
+
+def pdf_string(text):
+    data = text.encode('cp1252', errors='replace')
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+def serialize(idnum, obj):
+    buffer = io.BytesIO()
+    buffer.write(b'%d 0 obj\n' % idnum)
+    obj.write_to_stream(buffer, None)
+    buffer.write(b'\nendobj\n')
+    return buffer.getvalue()
+
+@lru_cache(maxsize=4)
+def load_template(template_pdfs):
+    # Once per process for the same template files
+    return build_template(template_pdfs)
+
+class TemplateObjects:
+    """
+    Numbers and serializes the objects every packet shares. PyPDF2 has no public API for objects
+    outside a document's page tree, so this is the one place that uses PdfWriter's _add_object,
+    _objects, _pages, _info and _root. They are those of PyPDF2 3.x, which merge.check_pypdf2
+    checks for.
+    """
+
+    def __init__(self):
+        from PyPDF2 import PdfWriter
+
+        check_pypdf2()
+        self.writer = PdfWriter()
+
+    def __len__(self):
+        return len(self.writer._objects)
+
+    def add(self, obj):
+        # Returns the IndirectObject that refers to obj
+        return self.writer._add_object(obj)
+
+    def clone(self, obj):
+        # Copies a reader's object, and every object it refers to, into the template
+        return obj.clone(self.writer)
+
+    def stream(self, data, entries):
+        # A stream object of already encoded data, with the entries that say how it is encoded
+        from PyPDF2.generic import StreamObject
+
+        stream = StreamObject()
+        set_encoded_data(stream, data)
+        stream.update(entries)
+        return stream
+
+    def serialize(self):
+        # The writer's own empty page tree, info and catalog are not part of a packet
+        writer = self.writer
+        unused = {writer._pages.idnum, writer._info.idnum, writer._root.idnum}
+        return [b'%d 0 obj\nnull\nendobj\n' % idnum if idnum in unused else serialize(idnum, obj)
+                for idnum, obj in enumerate(writer._objects, start=1)]
+
+def build_template(template_pdfs):
+    """
+    Reads the blank forms (paths or file objects) once. Returns (objects, page_entries, sections):
+    the serialized objects every packet shares (page templates as Form XObjects, their resources,
+    the stamp font), numbered from 1; for each template page the /Resources and /MediaBox entries
+    of its page object; and for each template PDF the (first, end) object indexes and (first, end)
+    page indexes that belong to it alone. Form fields of a fillable template are not carried over.
+    """
+    from PyPDF2 import PdfReader
+    from PyPDF2.generic import ArrayObject, DictionaryObject, NameObject
+
+    shared = TemplateObjects()
+    font = shared.add(DictionaryObject({
+        NameObject('/Type'): NameObject('/Font'), NameObject('/Subtype'): NameObject('/Type1'),
+        NameObject('/BaseFont'): NameObject('/Helvetica'), NameObject('/Encoding'): NameObject('/WinAnsiEncoding')}))
+    page_entries = []
+    sections = []
+    for pdf in template_pdfs:
+        first_object, first_page = len(shared), len(page_entries)
+        for page in PdfReader(pdf).pages:
+            contents = page['/Contents'].get_object()
+            streams = contents if isinstance(contents, ArrayObject) else [contents]
+            data = zlib.compress(b'\n'.join(stream.get_object().get_data() for stream in streams))
+            template = shared.stream(data, {
+                NameObject('/Type'): NameObject('/XObject'), NameObject('/Subtype'): NameObject('/Form'),
+                NameObject('/Filter'): NameObject('/FlateDecode'), NameObject('/BBox'): page.mediabox,
+                NameObject('/Resources'): shared.clone(page['/Resources'])})
+            resources = shared.add(DictionaryObject({
+                NameObject('/XObject'): DictionaryObject({NameObject('/Tpl'): shared.add(template)}),
+                NameObject('/Font'): DictionaryObject({NameObject('/FStamp'): font})}))
+            media_box = b' '.join(b'%g' % float(value) for value in page.mediabox)
+            page_entries.append(b' /Resources %d 0 R /MediaBox [%s]' % (resources.idnum, media_box))
+        sections.append((first_object, len(shared), first_page, len(page_entries)))
+    return shared.serialize(), page_entries, sections
+
+def barcode_ops(value, x, y, height):
+    # Code 128 bars as filled rectangles; returns (content stream bytes, width)
+    code = Code128(value, barWidth=0.75, barHeight=height, quiet=0)
+    code.validate()
+    code.encode()
+    code.decompose()
+    ops = []
+    left = 0
+    for c in code.decomposed:
+        bar_width = (ord(c.lower()) - ord('a') + 1) * 0.75
+        if c.isupper():
+            ops.append(b'%g %g %g %g re' % (x + left, y, bar_width, height))
+        left += bar_width
+    return b'\n'.join(ops) + b'\nf\n', left
+
+def footer_overlay(values, barcode_value=None):
+    """
+    The stamp printed below the form on every page of a packet: the participant's values as
+    "label: value" (at most two lines) and, when barcode_value is given, its Code 128 barcode at
+    the right. Returns content stream bytes.
+    """
+    width = letter[0]
+    text_width = width - 2 * FOOTER_MARGIN
+    overlay = b''
+    if barcode_value:
+        bars, bars_width = barcode_ops(barcode_value, 0, 16, 20)
+        overlay = b'q 1 0 0 1 %g 0 cm\n%sQ\n' % (width - FOOTER_MARGIN - bars_width, bars)
+        text_width -= bars_width + 10
+    text = "   ".join(f"{label}: {value}" for label, value in values)
+    lines = wrap_lines(text, "Helvetica", 9, text_width)[:2]
+    if lines:
+        shown = b' 0 -11 Td '.join(pdf_string(line) + b' Tj' for line in lines)
+        overlay += b'BT /FStamp 9 Tf %d 30 Td %s ET\n' % (FOOTER_MARGIN, shown)
+    return overlay
+
+class PacketWriter:
+    """
+    Streams stamped packets into one PDF: the shared template objects are written once, then
+    each add_packet() writes a page per template page that draws the template and its overlay.
+    sections picks, in order, the template PDFs (see build_template) the file uses; the objects
+    of the others are left out. close() writes the page tree and cross-reference table.
+    """
+
+    def __init__(self, output, template, sections=None):
+        objects, page_entries, template_sections = template
+        chosen = range(len(template_sections)) if sections is None else sections
+        left_out = set()
+        for section, (first_object, end_object, _, _) in enumerate(template_sections):
+            if section not in chosen:
+                left_out.update(range(first_object, end_object))
+        self.page_entries = [entries for section in chosen
+                             for entries in page_entries[slice(*template_sections[section][2:])]]
+        self.file = open(output, 'wb')
+        self.offsets = []
+        self.position = 0
+        self.write(PDF_HEADER)
+        for index, chunk in enumerate(objects):
+            # A left out object keeps its number, which is listed as free
+            self.offsets.append(None if index in left_out else self.position)
+            if index not in left_out:
+                self.write(chunk)
+        self.pages_id = self.reserve()
+        self.kids = []
+
+    def write(self, data):
+        self.file.write(data)
+        self.position += len(data)
+
+    def reserve(self):
+        self.offsets.append(None)
+        return len(self.offsets)
+
+    def write_object(self, idnum, body):
+        self.offsets[idnum - 1] = self.position
+        self.write(b'%d 0 obj\n%s\nendobj\n' % (idnum, body))
+
+    def add_packet(self, overlays, pages=None):
+        # overlays has a content stream per page of the packet: every template page, or the
+        # page_entries indexes in pages. Pages with the same overlay share it.
+        streams = {}
+        page_entries = self.page_entries if pages is None else [self.page_entries[i] for i in pages]
+        for entries, overlay in zip(page_entries, overlays):
+            if overlay not in streams:
+                streams[overlay] = self.reserve()
+                stream = b'q /Tpl Do Q\n' + overlay
+                self.write_object(streams[overlay], b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+            page = self.reserve()
+            self.write_object(page, b'<< /Type /Page /Parent %d 0 R /Contents %d 0 R%s >>'
+                              % (self.pages_id, streams[overlay], entries))
+            self.kids.append(page)
+
+    def close(self):
+        kids = b' '.join(b'%d 0 R' % kid for kid in self.kids)
+        self.write_object(self.pages_id, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(self.kids)))
+        catalog = self.reserve()
+        self.write_object(catalog, b'<< /Type /Catalog /Pages %d 0 R >>' % self.pages_id)
+        xref = self.position
+        self.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(self.offsets) + 1))
+        self.write(b''.join(b'0000000000 65535 f \n' if offset is None else b'%010d 00000 n \n' % offset
+                            for offset in self.offsets))
+        self.write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+                   % (len(self.offsets) + 1, catalog, xref))
+        self.file.close()
+
+def participant_overlays(participant, page_count, id_field, columns, barcode):
+    # Every page of a packet gets the same footer
+    values = [(column, participant.get(column) or '') for column in columns or participant]
+    return [footer_overlay(values, participant.get(id_field) if barcode else None)] * page_count
+
+def file_name(text):
+    return str(text).replace(os.sep, '_')
+
+def write_participant_files(participants, template_pdfs, output_dir, id_field, columns, barcode):
+    # Runs in a worker process for a batch of participants; the template is loaded once per process
+    template = load_template(template_pdfs)
+    for participant in participants:
+        writer = PacketWriter(os.path.join(output_dir, f"{file_name(participant[id_field])}.pdf"), template)
+        writer.add_packet(participant_overlays(participant, len(template[1]), id_field, columns, barcode))
+        writer.close()
+    return len(participants)
+
+def read_csv_rows(rows):
+    # A CSV path, or an iterable of dicts that is passed through
+    if not isinstance(rows, (str, os.PathLike)):
+        yield from rows
+        return
+    with open(rows, newline='', encoding='utf-8-sig') as f:
+        yield from csv.DictReader(f)
+
+def check_ids(participants, id_field, unique):
+    """
+    Raises ValueError when a participant row (numbered from 1) has no id_field value or, with
+    unique, when two rows would be written to the same file.
+    """
+    if participants and id_field not in participants[0]:
+        raise ValueError(f"The participants have no {id_field!r} column")
+    blank = [number for number, participant in enumerate(participants, start=1)
+             if participant.get(id_field) is None or not str(participant[id_field]).strip()]
+    if blank:
+        raise ValueError(f"Participant rows without a {id_field}: {', '.join(map(str, blank[:20]))}")
+    if unique:
+        names = Counter(file_name(participant[id_field]) for participant in participants)
+        repeated = [name for name, count in names.items() if count > 1]
+        if repeated:
+            raise ValueError(f"Participant files named more than once: {', '.join(repeated[:20])}")
+
+def batches(items, size):
+    items = iter(items)
+    while batch := list(islice(items, size)):
+        yield batch
+
+def stamp_packets(template_pdfs, participants, output_dir=None, print_file=None, id_field='study_id',
+                  columns=None, barcode=True, workers=1, batch_size=256):
+    """
+    Stamps a packet per participant onto already rendered blank CRFs (template_pdfs, in packet
+    order) without rendering them again. participants is a CSV path or an iterable of dicts;
+    columns picks the values printed in the footer (default every column) and barcode adds a
+    Code 128 of id_field. Writes output_dir/<id>.pdf per participant, or every packet one after
+    another into print_file. The participants' IDs are checked before anything is written (see
+    check_ids); print_file needs them only for the barcode. Returns a summary for the run report.
+    """
+    if (output_dir is None) == (print_file is None):
+        raise ValueError("Give exactly one of output_dir and print_file")
+    start = time.perf_counter()
+    participants = list(read_csv_rows(participants))
+    if output_dir is not None or barcode:
+        check_ids(participants, id_field, unique=output_dir is not None)
+    template_pdfs = tuple(map(os.fspath, template_pdfs))
+    template = load_template(template_pdfs)
+    count = 0
+    if print_file:
+        writer = PacketWriter(print_file, template)
+        for participant in participants:
+            writer.add_packet(participant_overlays(participant, len(template[1]), id_field, columns, barcode))
+            count += 1
+        writer.close()
+    else:
+        os.makedirs(output_dir, exist_ok=True)
+        write = partial(write_participant_files, template_pdfs=template_pdfs, output_dir=output_dir,
+                        id_field=id_field, columns=columns, barcode=barcode)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                count = sum(executor.map(write, batches(participants, batch_size)))
+        else:
+            count = sum(map(write, batches(participants, batch_size)))
+    return {'participants': count, 'pages_per_packet': len(template[1]),
+            'output': print_file or output_dir, 'seconds': time.perf_counter() - start}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="crf_generator.stamp",
+                                     description="Stamp participant packets onto rendered blank CRFs.")
+    parser.add_argument("participants_csv", help="One row per participant")
+    parser.add_argument("template_pdfs", nargs="+", help="Blank CRF PDFs, in packet order")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--output-dir", help="Write one PDF per participant here")
+    output.add_argument("--print-file", help="Write every packet into this one PDF")
+    parser.add_argument("--id-field", default="study_id", help="Column naming the files and encoded in the barcode")
+    parser.add_argument("--columns", help="Comma-separated columns printed in the footer (default: all)")
+    parser.add_argument("--no-barcode", dest="barcode", action="store_false")
+    parser.add_argument("--workers", type=int, default=1, help="Processes writing per-participant files")
+    args = parser.parse_args(argv)
+    columns = [column.strip() for column in args.columns.split(',')] if args.columns else None
+    summary = stamp_packets(args.template_pdfs, args.participants_csv, args.output_dir, args.print_file,
+                            args.id_field, columns, args.barcode, args.workers)
+    print(f"{summary['participants']} packets of {summary['pages_per_packet']} pages saved to "
+          f"{summary['output']} in {summary['seconds']:.1f} s")
+
+if __name__ == "__main__":
+    main()
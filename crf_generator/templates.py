@@ -0,0 +1,30 @@
+from reportlab.lib.pagesizes import letter
+
+WIDGET_WIDTH = letter[0] - 2 * 50  # Full-width boxes span text_width from layout_form
+
+# Widgets drawn over and over again, compiled once per canvas as Form XObjects:
+# name -> (bounding box, drawing ops relative to the widget origin).
+# A placed template costs about as much content as one rect, so single rects (text boxes,
+# checkboxes) stay inline; the notes stack and the four-curve radio circle are templated.
+# Matrix cells are all stamped, checkbox cells included, so a cell costs one doForm either way.
+WIDGETS = {
+    'notes_box': ((-1, -89, WIDGET_WIDTH + 1, 19), [('rect', 0, -22 * i, WIDGET_WIDTH, 18) for i in range(5)]),
+    'radio': ((-5, -5, 5, 5), [('circle', 0, 0, 4)]),
+    'checkbox': ((-6, -6, 6, 6), [('rect', -5, -5, 10, 10)]),
+}
+
+def define_widget(c, name):
+    (lowerx, lowery, upperx, uppery), ops = WIDGETS[name]
+    c.beginForm(name, lowerx, lowery, upperx, uppery)
+    for kind, *args in ops:
+        getattr(c, kind)(*args)
+    c.endForm()
+
+def paint_widget(c, name, x, y):
+    # Each canvas gets its own definitions, so forms drawn onto a shared canvas share them too
+    if not c.hasForm(name):
+        define_widget(c, name)
+    c.saveState()
+    c.translate(x, y)
+    c.doForm(name)
+    c.restoreState()
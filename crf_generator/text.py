@@ -0,0 +1,201 @@
+import math
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import accumulate
+
+from reportlab.pdfbase.pdfmetrics import getFont, stringWidth
+
+# Width in 1/1000 em of every word measured in this process: font_name -> {word: width}.
+# Shared by every form in a run.
+WORD_UNITS = {}
+
+@lru_cache(maxsize=None)
+def glyph_widths(font_name):
+    """
+    Glyph widths of a built-in font in 1/1000 em as a NumPy array indexed by code point. Control
+    characters and characters outside the font's WinAnsi encoding are -1: reportlab measures
+    those with a substitution font.
+    """
+    import numpy as np
+
+    widths = getFont(font_name).widths
+    # U+2122 is the highest code point in WinAnsi; the entry after it stands for all higher ones
+    table = np.full(0x2124, -1, dtype=np.int64)
+    for code in range(32, 256):
+        try:
+            char = bytes([code]).decode('cp1252')
+        except UnicodeDecodeError:
+            continue
+        if char != '\x7f':
+            table[ord(char)] = widths[code]
+    return table
+
+def word_width_units(word, font_name):
+    """
+    Width of a word in 1/1000 em. Glyph widths are whole numbers, so sums stay exact. A single
+    word is measured by reportlab; NumPy only pays off for many words at once (see wrap_texts).
+    """
+    known = WORD_UNITS.setdefault(font_name, {})
+    units = known.get(word)
+    if units is None:
+        units = known[word] = round(stringWidth(word, font_name, 1000))
+    return units
+
+def string_width(text, font_name, font_size):
+    # Same value as reportlab's stringWidth, built from the word widths
+    words = text.split(' ')
+    units = sum(word_width_units(word, font_name) for word in words)
+    return (units + word_width_units(' ', font_name) * (len(words) - 1)) * 0.001 * font_size
+
+@lru_cache(maxsize=1024)
+def line_limit(font_size, max_width):
+    # Widest line in whole 1/1000 em whose width, as reportlab scales it, is within max_width
+    limit = math.floor(max_width / (0.001 * font_size))
+    while (limit + 1) * 0.001 * font_size <= max_width:
+        limit += 1
+    while limit * 0.001 * font_size > max_width:
+        limit -= 1
+    return limit
+
+def line_ranges(ends, start, stop, space_units, fits):
+    """
+    Greedy line breaking of words start to stop from cumulative sums: ends[k] is the width of
+    the first k words with a space after each, so words i to j make a line ends[j] - ends[i] -
+    space_units wide, and the longest line within fits (see line_limit) is found by bisection.
+    Yields the (first, end) word indexes of each line.
+    """
+    first = start
+    while start < stop:
+        end = bisect_right(ends, ends[start] + space_units + fits, start + 1, stop + 1) - 1
+        if end == start:
+            # A word wider than the line gets a line of its own, after an empty line when it
+            # is the first word
+            if start == first:
+                yield start, start
+            end = start + 1
+        yield start, end
+        start = end
+
+@lru_cache(maxsize=8192)
+def wrap_lines(text, font_name, font_size, max_width):
+    """
+    Cached wrapping engine shared by every form in a run. Each word is measured once
+    per run and line breaks come from running sums instead of re-measuring the joined line.
+    """
+    words = text.split()
+    space_units = word_width_units(' ', font_name)
+    ends = list(accumulate((word_width_units(word, font_name) + space_units for word in words), initial=0))
+    return tuple(' '.join(words[first:end])
+                 for first, end in line_ranges(ends, 0, len(words), space_units, line_limit(font_size, max_width)))
+
+@lru_cache(maxsize=None)
+def whitespace_table():
+    # What str.split() splits on, by code point; U+3000 is the highest, the entry after it is False
+    import numpy as np
+
+    return np.array([chr(code).isspace() for code in range(0x3001)] + [False])
+
+def wrap_texts(texts, font_name, font_size, max_width):
+    """
+    Wraps many texts at once, with the same lines as wrap_lines. The texts are scanned as one
+    array of code points: words are found from the whitespace mask and measured from the running
+    sum of glyph widths, and all line breaks come from one running sum of word widths.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        return [wrap_lines(text, font_name, font_size, max_width) for text in texts]
+    if not texts:
+        return []
+
+    joined = '\n'.join(texts)
+    codes = np.frombuffer(joined.encode('utf-32-le'), dtype=np.uint32)
+    is_space = np.take(whitespace_table(), codes, mode='clip')
+    in_word = np.concatenate(([False], ~is_space, [False]))
+    starts = np.flatnonzero(in_word[1:] > in_word[:-1])
+    stops = np.flatnonzero(in_word[1:] < in_word[:-1])
+
+    widths = np.take(glyph_widths(font_name), codes, mode='clip')
+    totals = np.concatenate(([0], np.cumsum(widths)))
+    units = totals[stops] - totals[starts]
+    unknown = np.flatnonzero((widths < 0) & in_word[1:-1])
+    for i in np.unique(np.searchsorted(starts, unknown, 'right') - 1).tolist():
+        units[i] = round(stringWidth(joined[starts[i]:stops[i]], font_name, 1000))
+    space_units = word_width_units(' ', font_name)
+    ends = np.concatenate(([0], np.cumsum(units + space_units))).tolist()
+
+    # Each text's words, and whether anything but single spaces separates them
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    text_starts = np.concatenate(([0], np.cumsum(lengths + 1)[:-1]))
+    text_stops = text_starts + lengths
+    first_words = np.searchsorted(starts, text_starts).tolist()
+    stop_words = np.searchsorted(starts, text_stops).tolist()
+    odd = np.flatnonzero(is_space & ((codes != 32) | ~in_word[2:]))
+    odd_texts = np.searchsorted(text_starts, odd, 'right') - 1
+    irregular = np.zeros(len(texts), dtype=bool)
+    irregular[odd_texts[odd < text_stops[odd_texts]]] = True
+    irregular = irregular.tolist()
+
+    fits = line_limit(font_size, max_width)
+    starts, stops = starts.tolist(), stops.tolist()
+    wrapped = []
+    for first_word, stop_word, normalize in zip(first_words, stop_words, irregular):
+        lines = []
+        for first, end in line_ranges(ends, first_word, stop_word, space_units, fits):
+            line = joined[starts[first]:stops[end - 1]] if end > first else ''
+            lines.append(' '.join(line.split()) if normalize else line)
+        wrapped.append(tuple(lines))
+    return wrapped
+
+class LineCache:
+    """
+    Wrapped lines keyed on (text, font_name, font_size, max_width), kept for the life of the
+    process and evicted least recently used first, like wrap_lines' cache. wrap() looks every text
+    up and wraps only the misses, together in one wrap_texts pass.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.lines = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def wrap(self, texts, font_name, font_size, max_width):
+        keys = [(text, font_name, font_size, max_width) for text in texts]
+        with self.lock:
+            found = [self.lines.get(key) for key in keys]
+            for key, lines in zip(keys, found):
+                if lines is not None:
+                    self.lines.move_to_end(key)
+        missing = list(dict.fromkeys(text for text, lines in zip(texts, found) if lines is None))
+        wrapped = dict(zip(missing, wrap_texts(missing, font_name, font_size, max_width)))
+        with self.lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+            for text, lines in wrapped.items():
+                self.lines[text, font_name, font_size, max_width] = lines
+            while len(self.lines) > self.maxsize:
+                self.lines.popitem(last=False)
+        return [wrapped[text] if lines is None else lines for text, lines in zip(texts, found)]
+
+    def cache_info(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'maxsize': self.maxsize,
+                    'currsize': len(self.lines)}
+
+    def cache_clear(self):
+        with self.lock:
+            self.lines.clear()
+            self.hits = self.misses = 0
+
+# Lines of every label laid out in this process, shared by every form in a run and, in a long
+# running process such as the render server, across runs
+LAYOUT_LINES = LineCache(maxsize=65536)
+
+def wrap_text(text, canvas, max_width):
+    """
+    Wraps text to fit within the specified max width of the canvas.
+    """
+    return list(wrap_lines(text, "Helvetica", 12, max_width))
@@ -0,0 +1,84 @@
+import argparse
+import os
+import time
+
+from .api import version_number as default_version_number
+from .stamp import PacketWriter, build_template, file_name, footer_overlay, read_csv_rows
+
+def read_event_forms(mapping):
+    """
+    Returns {event: [form names]} in schedule order. mapping is such a dict already, or REDCap's
+    instrument designation export (arm_num, unique_event_name, form) as a CSV path or rows.
+    """
+    if isinstance(mapping, dict):
+        return {event: list(forms) for event, forms in mapping.items()}
+    events = {}
+    for row in read_csv_rows(mapping):
+        forms = events.setdefault(row['unique_event_name'], [])
+        if row['form'] not in forms:
+            forms.append(row['form'])
+    return events
+
+def assemble_visit_packets(mapping, forms_dir=".", output_dir=".", version_number=default_version_number,
+                           schedule_file=None, label_visits=True):
+    """
+    Builds a packet per visit from the form PDFs a previous run wrote to forms_dir, without
+    rendering or merging them again: each form PDF is read once, and a packet writes the page
+    content of just its forms. schedule_file also writes every packet, in schedule order, into
+    one PDF in which a form's pages are stored once and referenced by every visit that uses them.
+    label_visits prints the visit name at the foot of its pages. Returns a summary for the report.
+    """
+    start = time.perf_counter()
+    events = read_event_forms(mapping)
+    form_names = list(dict.fromkeys(form for forms in events.values() for form in forms))
+    pdfs = [os.path.join(forms_dir, f"{form}_{version_number}.pdf") for form in form_names]
+    missing = [form for form, pdf in zip(form_names, pdfs) if not os.path.exists(pdf)]
+    if missing:
+        raise ValueError(f"No rendered PDF in {forms_dir} for forms: {', '.join(missing)}")
+    template = build_template(pdfs)
+    sections = template[2]
+    section_of = {form: i for i, form in enumerate(form_names)}
+    os.makedirs(output_dir, exist_ok=True)
+
+    def overlays(event, page_count):
+        return [footer_overlay([("Visit", event)]) if label_visits else b''] * page_count
+
+    report = {'events': [], 'forms': len(form_names)}
+    for event, forms in events.items():
+        chosen = [section_of[form] for form in forms]
+        output_pdf = os.path.join(output_dir, f"{file_name(event)}_{version_number}.pdf")
+        writer = PacketWriter(output_pdf, template, chosen)
+        writer.add_packet(overlays(event, len(writer.page_entries)))
+        writer.close()
+        report['events'].append({'event': event, 'forms': forms, 'pages': len(writer.page_entries),
+                                 'output_pdf': output_pdf, 'bytes': os.path.getsize(output_pdf)})
+        print(f"Packet for visit '{event}' saved to {output_pdf}")
+
+    if schedule_file:
+        writer = PacketWriter(schedule_file, template)
+        for event, forms in events.items():
+            pages = [page for form in forms for page in range(*sections[section_of[form]][2:])]
+            writer.add_packet(overlays(event, len(pages)), pages)
+        writer.close()
+        report['schedule_file'] = schedule_file
+        report['schedule_bytes'] = os.path.getsize(schedule_file)
+        print(f"Visit schedule saved to {schedule_file}")
+    report['seconds'] = time.perf_counter() - start
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="crf_generator.visits",
+                                     description="Assemble a CRF packet per visit from rendered form PDFs.")
+    parser.add_argument("mapping_csv", help="REDCap instrument designation export (unique_event_name, form)")
+    parser.add_argument("--forms-dir", default=".", help="Where the form PDFs were rendered")
+    parser.add_argument("--output-dir", default=".", help="One packet per visit is written here")
+    parser.add_argument("--version-number", default=default_version_number)
+    parser.add_argument("--schedule-file", help="Also write every visit packet into this one PDF")
+    parser.add_argument("--no-visit-labels", dest="label_visits", action="store_false",
+                        help="Leave the pages unstamped")
+    args = parser.parse_args(argv)
+    assemble_visit_packets(args.mapping_csv, args.forms_dir, args.output_dir, args.version_number,
+                           args.schedule_file, args.label_visits)
+
+if __name__ == "__main__":
+    main()